@@ -0,0 +1,320 @@
+import json
+import logging
+import re
+from urllib.parse import parse_qsl
+from werkzeug.datastructures import MultiDict
+from werkzeug.http import parse_etags, quote_etag
+
+from models.ApiResponse import ApiResponse
+from models.AsyncSQLiteClient import AsyncSQLiteClient
+from models.Cereal import Cereal
+from models.FastJSONProvider import dumps
+from models.ResponseCache import ResponseCache
+from utils import (batch_query, body_id, fields_query, filter_query, is_authorised, page_query, search_query, similar_query,
+                   sort_query, stats_query, validate_request_body)
+
+CEREAL_BY_ID = re.compile(r"^/cereals/(\d+)$")
+SIMILAR_CEREALS = re.compile(r"^/cereals/(\d+)/similar$")
+
+export_log = logging.getLogger("cereals.export")
+
+
+class Request:
+    """
+    The parts of an ASGI request the handlers need, with the same attribute names as Flask's request
+    (method, args, is_json, json), so the helpers in utils work for both APIs.
+    """
+    def __init__(self, scope, body: bytes):
+        self.method = scope["method"]
+        self.path = scope["path"].rstrip("/") or "/"
+        self.args = MultiDict(parse_qsl(scope.get("query_string", b"").decode("utf-8"), keep_blank_values=True))
+
+        self.headers = {key.decode("latin-1").lower(): value.decode("latin-1") for key, value in scope.get("headers", [])}
+        self.is_json = self.headers.get("content-type", "").split(";")[0].strip() == "application/json"
+        # Like Flask, a body that isn't valid JSON raises when it is used
+        self._body = body
+
+    @property
+    def json(self):
+        if not self.is_json:
+            raise ValueError("Request body must be JSON")
+        return json.loads(self._body) if self._body else None
+
+
+class AsyncCerealAPI:
+    """
+    This class is the asyncio (ASGI) variant of CerealAPI, with the same routes and ApiResponse envelope:
+    - /ping: Returns "Pong!" if the API is running
+    - /cereals: GET - Returns a page of cereals, POST - Creates a new cereal
+    - /cereals/<id>: GET - Returns a cereal by ID, POST - Updates a cereal by ID, DELETE - Deletes a cereal by ID
+    - /cereals/batch: POST - Creates, updates and deletes many cereals in one transaction
+    - /cereals/export: GET - Streams all (filtered) cereals as NDJSON, also available as /cereals?format=ndjson
+    - /cereals/<id>/similar: GET - The cereals with the most similar nutrition (?k=10)
+    - /cereals/search: GET - Ranked prefix search on the name (?q=corn fla)
+    - /cereals/stats: GET - Aggregates (avg, percentiles, top-N, ...) of the numeric fields, optionally grouped
+    - /cache/stats: GET - Returns the hit/miss counters of the read cache
+    The instance is an ASGI application, run it with an ASGI server: uvicorn asgi:app
+    Database calls run on the AsyncSQLiteClient's thread pool, so slow clients only cost a coroutine, not a thread.
+    The GET endpoints for cereals (list, id, similar, search, stats) send an ETag and answer If-None-Match
+    with 304 Not Modified, like CerealAPI.
+    """
+    def __init__(self, sql_client: AsyncSQLiteClient):
+        self.sql_client = sql_client
+        cache = sql_client.sql_client.cache
+        self.responses = ResponseCache(cache.max_size, cache.ttl) if cache else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "lifespan":
+            await self._lifespan(receive, send)
+            return
+
+        if scope["type"] != "http":
+            return
+
+        body = b""
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get("body", b"")
+            more_body = message.get("more_body", False)
+
+        request = Request(scope, body)
+
+        try:
+            await self._dispatch(request, send)
+        except Exception as e:
+            await self._send_json(send, ApiResponse("error", str(e), 400))
+
+    async def _lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message["type"] == "lifespan.startup":
+                await send({"type": "lifespan.startup.complete"})
+            elif message["type"] == "lifespan.shutdown":
+                self.sql_client.close()
+                await send({"type": "lifespan.shutdown.complete"})
+                return
+
+    async def _dispatch(self, request: Request, send):
+        path, method = request.path, request.method
+
+        if path == "/ping" and method == "GET":
+            return await self._send_json(send, ApiResponse("success", "Pong!", 200))
+
+        if path == "/cache/stats" and method == "GET":
+            return await self._send_json(send, await self.sql_client.cache_stats())
+
+        if path == "/cereals/search" and method == "GET":
+            return await self._cached_get(request, send, lambda: self.search_cereals(request))
+
+        if path == "/cereals/stats" and method == "GET":
+            return await self._cached_get(request, send, lambda: self.get_stats(request))
+
+        if path == "/cereals/export" and method == "GET":
+            return await self.export_cereals(request, send)
+
+        if path == "/cereals/batch" and method == "POST":
+            return await self._send_json(send, await self._authorised(request) or await self.batch_cereals(request))
+
+        if path == "/cereals":
+            if method == "GET":
+                if request.args.get("format") == "ndjson":
+                    return await self.export_cereals(request, send)
+                return await self._cached_get(request, send, lambda: self.get_cereals(request))
+
+            if method == "POST":
+                result = await self._authorised(request) or validate_request_body(request)
+                if not result:
+                    try:
+                        id = body_id(request.json)
+                    except ValueError as e:
+                        return await self._send_json(send, ApiResponse("error", str(e), 400))
+                    result = await self.create_or_update_cereal(request, id)
+                return await self._send_json(send, result)
+
+        match = SIMILAR_CEREALS.match(path)
+        if match and method == "GET":
+            id = int(match.group(1))
+            return await self._cached_get(request, send, lambda: self.get_similar_cereals(request, id))
+
+        match = CEREAL_BY_ID.match(path)
+        if match:
+            id = int(match.group(1))
+
+            if method == "GET":
+                return await self._cached_get(request, send, lambda: self.get_cereal_by_id(request, id))
+
+            if method == "POST":
+                result = await self._authorised(request) or validate_request_body(request)
+                if not result:
+                    result = await self.create_or_update_cereal(request, id)
+                return await self._send_json(send, result)
+
+            if method == "DELETE":
+                result = await self._authorised(request) or await self.sql_client.delete(id)
+                return await self._send_json(send, result)
+
+        return await self._send_json(send, ApiResponse("error", "Not found", 404))
+
+    async def _authorised(self, request: Request):
+        """Returns an error ApiResponse if the request has no valid password, None if it is authorised."""
+        try:
+            request_json = request.json
+            request_json.get('password')
+        except Exception as e:
+            return ApiResponse("error", str(e), 400)
+
+        if not is_authorised(request_json):
+            return ApiResponse("error", "Unauthorized", 401)
+
+        return None
+
+    async def get_cereals(self, request: Request) -> ApiResponse:
+        """Same as CerealAPI.get_cereals: filters, sorting, fields and keyset pagination."""
+        try:
+            limit, cursor = page_query(request.args)
+            query = filter_query(request.args)
+            sort = sort_query(request.args)
+            fields = fields_query(request.args)
+
+            if not query and not sort:
+                return await self.sql_client.read_all(limit, cursor, fields)
+
+            return await self.sql_client.filter(query, limit, cursor, sort, fields)
+        except Exception as e:
+            return ApiResponse("error", str(e), 400)
+
+    async def get_cereal_by_id(self, request: Request, id: int) -> ApiResponse:
+        """Same as CerealAPI.get_cereal_by_id."""
+        try:
+            return await self.sql_client.read(id, fields_query(request.args))
+        except Exception as e:
+            return ApiResponse("error", str(e), 400)
+
+    async def get_similar_cereals(self, request: Request, id: int) -> ApiResponse:
+        """Same as CerealAPI.get_similar_cereals."""
+        try:
+            return await self.sql_client.similar(id, similar_query(request.args))
+        except Exception as e:
+            return ApiResponse("error", str(e), 400)
+
+    async def search_cereals(self, request: Request) -> ApiResponse:
+        """Same as CerealAPI.search_cereals."""
+        try:
+            match = search_query(request.args)
+            limit, _ = page_query(request.args)
+            return await self.sql_client.search(match, filter_query(request.args), limit)
+        except Exception as e:
+            return ApiResponse("error", str(e), 400)
+
+    async def get_stats(self, request: Request) -> ApiResponse:
+        """Same as CerealAPI.get_stats."""
+        try:
+            fields, group_by, aggregates, top = stats_query(request.args)
+            return await self.sql_client.stats(fields, group_by, aggregates, filter_query(request.args), top)
+        except Exception as e:
+            return ApiResponse("error", str(e), 400)
+
+    async def create_or_update_cereal(self, request: Request, id) -> ApiResponse:
+        try:
+            cereal = Cereal.from_dict(request.json)
+
+            if not id:
+                return await self.sql_client.create(cereal)
+
+            # update returns 404 itself when no row has the id
+            return await self.sql_client.update(id, cereal)
+        except Exception as e:
+            return ApiResponse("error", str(e), 400)
+
+    async def batch_cereals(self, request: Request) -> ApiResponse:
+        """Same as CerealAPI.batch_cereals."""
+        try:
+            operations, errors = batch_query(request.json)
+            results = errors
+
+            if operations:
+                result = await self.sql_client.batch([(op, id, cereal) for _, op, id, cereal in operations])
+
+                if result.status_code != 200:
+                    return result
+
+                for (index, _, _, _), item in zip(operations, result.data):
+                    results.append({"index": index, **item})
+
+            results.sort(key=lambda item: item["index"])
+            return ApiResponse("success", "Batch executed", 200, results)
+
+        except Exception as e:
+            return ApiResponse("error", str(e), 400)
+
+    async def export_cereals(self, request: Request, send):
+        """
+        Streams the cereals as NDJSON, one database batch per chunk of the response body.
+        The first batch is fetched before the response starts, so invalid filters and database errors
+        still get an error response. A later failure ends the body early, the status can't change anymore.
+        """
+        try:
+            filters = filter_query(request.args)
+        except Exception as e:
+            return await self._send_json(send, ApiResponse("error", str(e), 400))
+
+        batches = self.sql_client.stream(filters)
+        try:
+            batch = await anext(batches, None)
+        except Exception as e:
+            await batches.aclose()
+            return await self._send_json(send, ApiResponse("error", str(e), 500))
+
+        await send({
+            "type": "http.response.start",
+            "status": 200,
+            "headers": [(b"content-type", b"application/x-ndjson")],
+        })
+
+        try:
+            while batch is not None:
+                chunk = b"".join(dumps(row) + b"\n" for row in batch)
+                await send({"type": "http.response.body", "body": chunk, "more_body": True})
+                batch = await anext(batches, None)
+        except Exception:
+            export_log.exception("Export failed after the response started, the body ends early")
+        finally:
+            await batches.aclose()
+            await send({"type": "http.response.body", "body": b""})
+
+    async def _cached_get(self, request: Request, send, handler):
+        """Same as CerealAPI._cached_get, handler is a coroutine function returning an ApiResponse."""
+        if self.responses is None:
+            return await self._send_json(send, await handler())
+
+        version = self.sql_client.version
+        etag = self.responses.etag(version)
+
+        key = (request.path, tuple(sorted(request.args.items(multi=True))))
+        body = self.responses.get(key, version)
+
+        if body is None:
+            result = await handler()
+            if result.status_code != 200:
+                return await self._send_json(send, result)
+            body = dumps(result.to_dict())
+            self.responses.put(key, version, body)
+
+        if parse_etags(request.headers.get("if-none-match")).contains(etag):
+            return await self._send(send, 304, b"", etag)
+
+        await self._send(send, 200, body, etag)
+
+    async def _send_json(self, send, result: ApiResponse):
+        await self._send(send, result.status_code, dumps(result.to_dict()))
+
+    async def _send(self, send, status: int, body: bytes, etag: str = None):
+        headers = [(b"content-length", str(len(body)).encode())]
+        if status != 304:
+            headers.append((b"content-type", b"application/json"))
+        if etag:
+            headers.append((b"etag", quote_etag(etag).encode("latin-1")))
+
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
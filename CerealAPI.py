@@ -1,11 +1,19 @@
+import logging
 import os
-from flask import Flask, request
+from flask import Flask, Response, request, stream_with_context
 
 
-from models.SQLiteClient import SQLiteClient
+from models.Storage import Storage
 from models.Cereal import Cereal
-from utils import filter_query, is_authorised, validate_request_body
+from utils import (batch_query, body_id, fields_query, filter_query, is_authorised, page_query, search_query, similar_query,
+                   sort_query, stats_query, validate_request_body)
 from models.ApiResponse import ApiResponse
+from models.FastJSONProvider import FastJSONProvider, dumps
+from models.Metrics import Metrics
+from models.ResponseCache import ResponseCache
+from models.TrafficRecorder import TrafficRecorder
+
+export_log = logging.getLogger("cereals.export")
 
 
 class CerealAPI():
@@ -14,29 +22,58 @@ class CerealAPI():
     It initializes the Flask app and registers the routes for the API.
     The routes are:
     - /ping: Returns "Pong!" if the API is running
-    - /cereals: GET - Returns all cereals, POST - Creates a new cereal
+    - /cereals: GET - Returns a page of cereals (?limit=&cursor=), POST - Creates a new cereal
     - /cereals/<id>: GET - Returns a cereal by ID, POST - Updates a cereal by ID, DELETE - Deletes a cereal by ID
+    - /cereals/batch: POST - Creates, updates and deletes many cereals in one transaction
+    - /cereals/export: GET - Streams all (filtered) cereals as NDJSON, also available as /cereals?format=ndjson
+    - /cereals/<id>/similar: GET - The cereals with the most similar nutrition (?k=10)
+    - /cereals/search: GET - Ranked prefix search on the name (?q=corn fla)
+    - /cereals/stats: GET - Aggregates (avg, percentiles, top-N, ...) of the numeric fields, optionally grouped
+    - /cache/stats: GET - Returns the hit/miss counters of the read cache
+    - /metrics: GET - Request, query, connection and serialization metrics (only when metrics are enabled)
     The response always returns a jsonified ApiResponse object.
+    The cereals are kept by a Storage: SQLiteClient, or MemoryStorage for an in-memory deployment.
+    If capture_path is given every request is recorded there with a TrafficRecorder, for replaying later.
+    If a Metrics object is given the handlers are timed and /metrics serves the metrics in the Prometheus format.
+    The GET endpoints for cereals (list, id, similar, search, stats) send an ETag and answer If-None-Match
+    with 304 Not Modified (see _cached_get).
     """
-    def __init__(self, sql_client: SQLiteClient):
+    def __init__(self, storage: Storage, capture_path: str = None, metrics: Metrics = None):
         self.app = Flask(__name__)
+        self.app.json = FastJSONProvider(self.app)  # Unsorted keys, orjson when installed
         self._register_routes()
+        self.metrics = metrics
+        if metrics:
+            metrics.install(self.app)
+            self.app.add_url_rule("/metrics", "metrics", self.get_metrics, methods=["GET"])
+        self.recorder = TrafficRecorder(capture_path) if capture_path else None
+        if self.recorder:
+            self.recorder.install(self.app)
         self.app.url_map.strict_slashes = False  # Disable strict slashes
-        self.sql_client = sql_client
-        self.app.config['JSON_SORT_KEYS'] = False  # Disable sorting of keys
+        self.storage = storage
+        # Serialized GET bodies and ETags, only when the read cache is on (i.e. a single process, see ResponseCache)
+        cache = storage.cache
+        self.responses = ResponseCache(cache.max_size, cache.ttl) if cache else None
 
     def _register_routes(self):
         @self.app.route("/ping", methods=["GET"])
         def ping():
-            result, status_code = ApiResponse("success", "Pong!", 200)
-            return result.to_json(), status_code
+            result = ApiResponse("success", "Pong!", 200)
+            return result.to_json(), result.status_code
+
+        @self.app.route("/cache/stats", methods=["GET"])
+        def cache_stats():
+            result = self.storage.cache_stats()
+            return result.to_json(), result.status_code
 
         @self.app.route("/cereals", methods=["GET", "POST"])
         def handle_cereals():
         # This function handles GET and POST requests to the /cereals endpoint
             if request.method == "GET":
-                result, status_code = self.get_cereals()
-                return result, status_code
+                if request.args.get("format") == "ndjson":
+                    return self.export_cereals()
+
+                return self._cached_get(self.get_cereals)
             elif request.method == "POST":
                 try:
                     request.json.get('password')
@@ -54,18 +91,52 @@ class CerealAPI():
                 if validation_error:
                     return validation_error.to_json(), 400
                 
-                id = request.json.get('id')
+                try:
+                    id = body_id(request.json)
+                except ValueError as e:
+                    return ApiResponse("error", str(e), 400).to_json(), 400
 
                 result, status_code = self.create_or_update_cereal(id)
                 return result, status_code
 
+        @self.app.route("/cereals/batch", methods=["POST"])
+        def handle_batch():
+            try:
+                request.json.get('password')
+
+            except Exception as e:
+                return ApiResponse("error", str(e), 400).to_json(), 400
+
+            authorised = is_authorised(request.json)
+
+            if not authorised:
+                return ApiResponse("error", "Unauthorized", 401).to_json(), 401
+
+            result, status_code = self.batch_cereals()
+            return result, status_code
+
+        @self.app.route("/cereals/<int:id>/similar", methods=["GET"])
+        def similar_cereals(id):
+            return self._cached_get(lambda: self.get_similar_cereals(id))
+
+        @self.app.route("/cereals/search", methods=["GET"])
+        def search_cereals():
+            return self._cached_get(self.search_cereals)
+
+        @self.app.route("/cereals/stats", methods=["GET"])
+        def cereal_stats():
+            return self._cached_get(self.get_stats)
+
+        @self.app.route("/cereals/export", methods=["GET"])
+        def export_cereals():
+            return self.export_cereals()
+
         @self.app.route("/cereals/<int:id>", methods=["GET", "POST", "DELETE"])
         def handle_cereal_by_id(id):
         # This function handles GET, POST, and DELETE requests to the /cereals/<id> endpoint
             try:
                 if request.method == "GET":
-                    result, status_code = self.get_cereal_by_id(id)
-                    return result, status_code
+                    return self._cached_get(lambda: self.get_cereal_by_id(id))
 
                 elif request.method == "POST":
                     try:
@@ -105,21 +176,150 @@ class CerealAPI():
             except Exception as e:
                 return ApiResponse("error", str(e), 400).to_json(), 400
 
+    def _cached_get(self, handler):
+        """
+        Runs a GET handler through the ResponseCache.
+        The ETag only depends on the table version, and a body serialized at the current version is sent again as is.
+        A matching If-None-Match is answered with a 304 only once the request is known to succeed at this version
+        (its body is cached, or the handler just returned it), so invalid parameters still get their error.
+        Only 200 responses are cached.
+        """
+        if self.responses is None:
+            return handler()
+
+        version = self.storage.version
+        etag = self.responses.etag(version)
+
+        key = (request.path, tuple(sorted(request.args.items(multi=True))))
+        body = self.responses.get(key, version)
+
+        if body is None:
+            response, status_code = handler()
+            if status_code != 200:
+                return response, status_code
+            body = response.get_data()
+            # The version was read before the handler ran, so a write during it makes this entry stale, not wrong
+            self.responses.put(key, version, body)
+
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, status=200, mimetype="application/json")
+
+        response.set_etag(etag)
+        return response
+
     def get_cereals(self):
         """
         Handles the business logic for getting all cereals or filtering cereals based on query parameters.
+        Filters take an optional operator (e.g. calories__lt=100), ?sort= orders the results and ?fields= selects fields.
+        Results are paginated: ?limit= sets the page size and ?cursor= takes the next_cursor of the previous page.
         """
         try:
-            if not request.args:
-                result = self.sql_client.read_all()
+            limit, cursor = page_query(request.args)
+            query = filter_query(request.args)
+            sort = sort_query(request.args)
+            fields = fields_query(request.args)
+
+            if not query and not sort:
+                result = self.storage.read_all(limit, cursor, fields)
                 return result.to_json(), result.status_code
 
-            query = filter_query(request.args)
-            result = self.sql_client.filter(query)
+            result = self.storage.filter(query, limit, cursor, sort, fields)
+            return result.to_json(), result.status_code
+        except Exception as e:
+            return ApiResponse("error", str(e), 400).to_json(), 400
+
+    def get_similar_cereals(self, id):
+        """Handles the business logic for the k nearest cereals by nutrition, ?k= sets how many."""
+        try:
+            result = self.storage.similar(id, similar_query(request.args))
+            return result.to_json(), result.status_code
+        except Exception as e:
+            return ApiResponse("error", str(e), 400).to_json(), 400
+
+    def search_cereals(self):
+        """
+        Handles the business logic for the name search: ?q= holds the words to look for, best matches come first.
+        ?limit= caps the number of results and filters work as for /cereals.
+        """
+        try:
+            match = search_query(request.args)
+            limit, _ = page_query(request.args)
+            result = self.storage.search(match, filter_query(request.args), limit)
             return result.to_json(), result.status_code
         except Exception as e:
             return ApiResponse("error", str(e), 400).to_json(), 400
 
+    def get_stats(self):
+        """
+        Handles the business logic for the aggregates endpoint.
+        ?fields= picks the numeric fields, ?group_by= a field to group on, ?aggregates= e.g. avg,std,p90
+        and ?top= the number of highest rows (by the first field) per group. Filters work as for /cereals.
+        """
+        try:
+            fields, group_by, aggregates, top = stats_query(request.args)
+            result = self.storage.stats(fields, group_by, aggregates, filter_query(request.args), top)
+            return result.to_json(), result.status_code
+        except Exception as e:
+            return ApiResponse("error", str(e), 400).to_json(), 400
+
+    def batch_cereals(self):
+        """
+        Handles the business logic for a batch of create/update/delete operations.
+        Invalid items are reported with status 400 and skipped, the valid ones run in a single transaction.
+        The response data holds one result per operation, in the order they were sent.
+        """
+        try:
+            operations, errors = batch_query(request.json)
+            results = errors
+
+            if operations:
+                result = self.storage.batch([(op, id, cereal) for _, op, id, cereal in operations])
+
+                if result.status_code != 200:
+                    return result.to_json(), result.status_code
+
+                for (index, _, _, _), item in zip(operations, result.data):
+                    results.append({"index": index, **item})
+
+            results.sort(key=lambda item: item["index"])
+            return ApiResponse("success", "Batch executed", 200, results).to_json(), 200
+
+        except Exception as e:
+            return ApiResponse("error", str(e), 400).to_json(), 400
+
+    def get_metrics(self):
+        return Response(self.metrics.render(), mimetype="text/plain; version=0.0.4")
+
+    def export_cereals(self):
+        """
+        Streams every cereal (optionally filtered by the query parameters) as newline-delimited JSON.
+        Every chunk of the body is one keyset page of Storage.stream, so memory use doesn't grow with the size
+        of the table and nothing is held open while the client reads. The first page is fetched before the
+        response starts, so invalid filters and database errors still get an error response.
+        """
+        try:
+            batches = self.storage.stream(filter_query(request.args))
+            batch = next(batches, None)
+        except ValueError as e:
+            return ApiResponse("error", str(e), 400).to_json(), 400
+        except Exception as e:
+            return ApiResponse("error", str(e), 500).to_json(), 500
+
+        def generate():
+            try:
+                current = batch
+                while current is not None:
+                    yield b"".join(dumps(row) + b"\n" for row in current)
+                    current = next(batches, None)
+            except Exception:
+                export_log.exception("Export failed after the response started, the body ends early")
+            finally:
+                batches.close()
+
+        return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
     def create_or_update_cereal(self, id):
         """
         Handles the business logic for creating or updating a cereal.
@@ -129,31 +329,23 @@ class CerealAPI():
             cereal = Cereal.from_dict(data)
 
             if not id:
-                result = self.sql_client.create(cereal)
+                result = self.storage.create(cereal)
                 return result.to_json(), result.status_code
             else:
-                product_exists = self.sql_client.does_product_exist(id)
-
-                if product_exists:
-                    result = self.sql_client.update(cereal.id, cereal)
-                    return result.to_json(), result.status_code
-                else:
-                    return ApiResponse("error", "Cereal not found", 404).to_json(), 404
+                # update returns 404 itself when no row has the id
+                result = self.storage.update(id, cereal)
+                return result.to_json(), result.status_code
         except Exception as e:
             return ApiResponse("error", str(e), 400).to_json(), 400
 
     def get_cereal_by_id(self, id):
         """
-        Handles the business logic for getting a cereal by ID.
+        Handles the business logic for getting a cereal by ID, ?fields= selects fields.
         """
         try:
-            product_exists = self.sql_client.does_product_exist(id)
-
-            if product_exists:
-                result = self.sql_client.read(id)
-                return result.to_json(), result.status_code
-            else:
-                return ApiResponse("error", "Cereal not found", 404).to_json(), 404
+            # read returns 404 itself when no row has the id
+            result = self.storage.read(id, fields_query(request.args))
+            return result.to_json(), result.status_code
 
         except Exception as e:
             return ApiResponse("error", str(e), 400).to_json(), 400
@@ -163,13 +355,8 @@ class CerealAPI():
         try:
             cereal = Cereal.from_dict(data)
 
-            product_exists = self.sql_client.does_product_exist(id)
-
-            if product_exists:
-                result = self.sql_client.update(id, cereal)
-                return result.to_json(), result.status_code
-            else:
-                return ApiResponse("error", "Cereal not found", 404).to_json(), 404
+            result = self.storage.update(id, cereal)
+            return result.to_json(), result.status_code
 
         except Exception as e:
             return ApiResponse("error", str(e), 400).to_json(), 400
@@ -177,7 +364,7 @@ class CerealAPI():
     def delete_cereal(self, id):
         """Handles the business logic for deleting a cereal."""
         try:
-            result = self.sql_client.delete(id)
+            result = self.storage.delete(id)
 
             return result.to_json(), result.status_code
 
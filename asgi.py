@@ -0,0 +1,32 @@
+import os
+from AsyncCerealAPI import AsyncCerealAPI
+from models.AsyncSQLiteClient import AsyncSQLiteClient
+from models.MemoryStorage import MemoryStorage
+from models.parser import Parser
+from models.Storage import create_storage
+
+
+def create_app():
+    """
+    Builds the asyncio app for an ASGI server (e.g. uvicorn asgi:app).
+    Configuration comes from the environment, like wsgi.py:
+    CEREAL_STORAGE (sqlite or memory), CEREAL_DB (database file), CEREAL_POOL_SIZE, CEREAL_CACHE_SIZE (0 disables the read cache),
+    CEREAL_GROUP_COMMIT_MS (group commit delay for writes) and CEREAL_MULTI_PROCESS (1 for several worker processes).
+    The SQLite database is expected to be seeded already, e.g. by main.py, the memory storage is seeded here.
+    The database is closed by the ASGI lifespan shutdown event.
+    """
+    storage = create_storage(
+        os.getenv("CEREAL_STORAGE", "sqlite"),
+        os.getenv("CEREAL_DB", "cereals.db"),
+        pool_size=int(os.getenv("CEREAL_POOL_SIZE", 5)),
+        cache_size=int(os.getenv("CEREAL_CACHE_SIZE", 1024)),
+        group_commit_ms=float(os.getenv("CEREAL_GROUP_COMMIT_MS", 0)),
+        multi_process=os.getenv("CEREAL_MULTI_PROCESS") == "1",
+    )
+    if isinstance(storage, MemoryStorage):
+        storage.seed(Parser())  # Starts empty in every process
+
+    return AsyncCerealAPI(AsyncSQLiteClient(storage))
+
+
+app = create_app()
@@ -0,0 +1,104 @@
+"""
+Compares the slotted, schema-driven Cereal with the __dict__-based class it replaced:
+memory for 100k instances and the time to build instances and convert them with from_dict, to_dict and to_row.
+Run from the project root: python -m benchmarks.cereal_model
+"""
+import os
+import sys
+import timeit
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.Cereal import Cereal
+
+INSTANCES = 100000
+ROUNDS = 100000
+
+ROW = ("Benchmark Bran", "K", "C", 70, 4.0, 1.0, 130.0, 10.0, 5.0, 6.0, 280.0, 25.0, 3, 1.0, 0.33, 68.4)
+BODY = {"name": "Benchmark Bran", "mfr": "K", "type": "C", "calories": 70, "protein": 4, "fat": 1, "sodium": 130,
+        "fiber": 10.0, "carbo": 5.0, "sugars": 6, "potass": 280, "vitamins": 25, "shelf": 3, "weight": 1.0,
+        "cups": 0.33, "rating": 68.4}
+
+
+class LegacyCereal:
+    # The Cereal class before the schema: attributes in a per-instance __dict__, no type coercion
+    def __init__(self, name, mfr, type_, calories=0, protein=0, fat=0, sodium=0, fiber=0.0, carbo=0.0, sugars=0,
+                 potass=0, vitamins=0, shelf=0, weight=0.0, cups=0.0, rating=0.0, id=None):
+        self.id = id
+        self.name = name
+        self.mfr = mfr
+        self.type_ = type_
+        self.calories = calories
+        self.protein = protein
+        self.fat = fat
+        self.sodium = sodium
+        self.fiber = fiber
+        self.carbo = carbo
+        self.sugars = sugars
+        self.potass = potass
+        self.vitamins = vitamins
+        self.shelf = shelf
+        self.weight = weight
+        self.cups = cups
+        self.rating = rating
+
+    @classmethod
+    def from_dict(cls, data):
+        if 'name' not in data or 'mfr' not in data or 'type' not in data:
+            raise ValueError("Missing required fields: 'name', 'mfr', and 'type' are mandatory.")
+
+        return cls(
+            id=data.get('id'), name=data.get('name'), mfr=data.get('mfr'), type_=data.get('type'),
+            calories=data.get('calories', 0), protein=data.get('protein', 0), fat=data.get('fat', 0),
+            sodium=data.get('sodium', 0), fiber=data.get('fiber', 0.0), carbo=data.get('carbo', 0.0),
+            sugars=data.get('sugars', 0), potass=data.get('potass', 0), vitamins=data.get('vitamins', 0),
+            shelf=data.get('shelf', 0), weight=data.get('weight', 0.0), cups=data.get('cups', 0.0),
+            rating=data.get('rating', 0.0)
+        )
+
+    def to_row(self):
+        return (
+            self.name, self.mfr, self.type_, self.calories, self.protein, self.fat,
+            self.sodium, self.fiber, self.carbo, self.sugars, self.potass,
+            self.vitamins, self.shelf, self.weight, self.cups, self.rating
+        )
+
+    def to_dict(self):
+        return {key: value for key, value in self.__dict__.items() if key != 'id'}
+
+
+def memory(cls):
+    # Only the instances are measured, the field values are shared between them
+    tracemalloc.start()
+    instances = [cls(*ROW) for _ in range(INSTANCES)]
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del instances
+    return size
+
+
+def report(label, legacy, slotted, unit):
+    print(f"{label:<24} {legacy:10.2f} {slotted:10.2f} {unit}")
+
+
+def main():
+    print(f"{'':<24} {'before':>10} {'after':>10}")
+
+    report(f"memory, {INSTANCES} objects", memory(LegacyCereal) / 1e6, memory(Cereal) / 1e6, "MB")
+
+    for label, legacy, slotted in [
+        ("construct", lambda: LegacyCereal(*ROW), lambda: Cereal(*ROW)),
+        ("from_dict", lambda: LegacyCereal.from_dict(BODY), lambda: Cereal.from_dict(BODY)),
+    ]:
+        report(label, timeit.timeit(legacy, number=ROUNDS) / ROUNDS * 1e6,
+               timeit.timeit(slotted, number=ROUNDS) / ROUNDS * 1e6, "µs/object")
+
+    legacy, slotted = LegacyCereal(*ROW), Cereal(*ROW)
+    for method in ("to_dict", "to_row"):
+        report(method, timeit.timeit(getattr(legacy, method), number=ROUNDS) / ROUNDS * 1e6,
+               timeit.timeit(getattr(slotted, method), number=ROUNDS) / ROUNDS * 1e6, "µs/object")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Compares concurrent single-row creates committed one by one with group commit (SQLiteClient's group_commit_ms),
+with synchronous=NORMAL (the default, no fsync per commit in WAL mode) and synchronous=FULL (an fsync per commit).
+Run from the project root: python -m benchmarks.group_commit
+"""
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.Cereal import Cereal
+from models.SQLiteClient import SQLiteClient
+
+WRITERS = 16
+WRITES = 2000
+ROW = ("Benchmark Bran", "K", "C", 70, 4.0, 1.0, 130.0, 10.0, 5.0, 6.0, 280.0, 25.0, 3, 1.0, 0.33, 68.4)
+
+
+def run(directory, synchronous, group_commit_ms):
+    database = os.path.join(directory, f"bench-{synchronous}-{group_commit_ms}.db")
+    client = SQLiteClient(database, pool_size=WRITERS, pragmas={"synchronous": synchronous},
+                          group_commit_ms=group_commit_ms)
+    cereal = Cereal(*ROW)
+
+    with ThreadPoolExecutor(WRITERS) as executor:
+        start = time.perf_counter()
+        results = list(executor.map(lambda _: client.create(cereal).status_code, range(WRITES)))
+        elapsed = time.perf_counter() - start
+
+    client.close()
+    assert results.count(201) == WRITES, "every create should succeed"
+    return WRITES / elapsed
+
+
+def main():
+    print(f"{WRITES} creates from {WRITERS} threads")
+    print(f"{'synchronous':<12} {'group commit':<14} {'writes/s':>10}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        for synchronous in ("NORMAL", "FULL"):
+            for group_commit_ms in (None, 1, 2):
+                label = f"{group_commit_ms} ms" if group_commit_ms else "off"
+                print(f"{synchronous:<12} {label:<14} {run(directory, synchronous, group_commit_ms):10.0f}")
+
+
+if __name__ == "__main__":
+    main()
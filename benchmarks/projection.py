@@ -0,0 +1,60 @@
+"""
+Compares fetching and serializing 100k cereals with every column against ?fields= projections
+(read_all with fields), on SQLiteClient and MemoryStorage with the read cache disabled.
+Run from the project root: python -m benchmarks.projection
+"""
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.FastJSONProvider import dumps
+from models.MemoryStorage import MemoryStorage
+from models.SQLiteClient import SQLiteClient
+
+ROWS = 100000
+ROUNDS = 3
+PROJECTIONS = [
+    ("every field", None),
+    ("name,rating", ["name", "rating"]),
+    ("rating", ["rating"]),
+]
+
+
+def make_row(index):
+    return (f"Benchmark Bran {index}", "K", "C", 70, 4.0, 1.0, 130.0, 10.0, 5.0, 6.0, 280.0, 25.0, 3, 1.0, 0.33, 68.4)
+
+
+def best_of(function):
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        storages = [
+            ("sqlite", SQLiteClient(os.path.join(directory, "bench.db"), cache_size=0)),
+            ("memory", MemoryStorage(cache_size=0)),
+        ]
+
+        print(f"read_all() of {ROWS} rows, best of {ROUNDS}")
+        for name, storage in storages:
+            storage.insert_data(make_row(index) for index in range(ROWS))
+
+            for label, fields in PROJECTIONS:
+                fetch, result = best_of(lambda: storage.read_all(fields=fields))
+                serialize, body = best_of(lambda: dumps(result.to_dict()))
+                print(f"{name:<8} {label:<12} fetch {fetch * 1000:8.1f} ms   serialize {serialize * 1000:8.1f} ms   "
+                      f"{len(body) / 1e6:6.1f} MB")
+
+            storage.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+"""
+Measures how reads scale across threads on SQLiteClient's read-only connections (read_pool),
+on their own and while WRITERS threads keep writing through the writer connection (synchronous=FULL,
+so every commit waits for an fsync). The read cache is disabled, so every read runs a query.
+Run from the project root: python -m benchmarks.read_replicas
+"""
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.Cereal import Cereal
+from models.Filter import Filter
+from models.SQLiteClient import SQLiteClient
+
+ROWS = 20000
+DURATION = 2.0
+THREADS = (1, 2, 4, 8)
+WRITERS = 4
+ROW = ("Benchmark Bran", "K", "C", 70, 4.0, 1.0, 130.0, 10.0, 5.0, 6.0, 280.0, 25.0, 3, 1.0, 0.33, 68.4)
+
+
+def reader(client, deadline):
+    # A mix of point reads and small filtered pages, like the API's read traffic
+    count = 0
+    filters = [Filter("calories", "100", "gt")]
+    while time.perf_counter() < deadline:
+        if count % 4:
+            assert client.read(random.randint(1, ROWS)).status_code == 200
+        else:
+            client.filter(filters, limit=20, cursor=None)
+        count += 1
+    return count
+
+
+def writer(client, stop, counter):
+    cereal = Cereal(*ROW)
+    while not stop.is_set():
+        client.update(random.randint(1, ROWS), cereal)
+        counter[0] += 1
+
+
+def run(client, threads, writing):
+    stop, writes = threading.Event(), [0]
+    writers = [threading.Thread(target=writer, args=(client, stop, writes)) for _ in range(WRITERS if writing else 0)]
+    for thread in writers:
+        thread.start()
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(threads) as executor:
+        reads = sum(executor.map(reader, [client] * threads, [start + DURATION] * threads))
+    elapsed = time.perf_counter() - start
+
+    stop.set()
+    for thread in writers:
+        thread.join()
+
+    return reads / elapsed, writes[0] / elapsed
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        client = SQLiteClient(os.path.join(directory, "bench.db"), pool_size=max(THREADS), cache_size=0,
+                               pragmas={"synchronous": "FULL"})
+        client.insert_data(ROW[:3] + (50 + index % 100,) + ROW[4:] for index in range(ROWS))
+
+        print(f"reads/s over {DURATION:.0f} s, {ROWS} rows, read cache disabled")
+        print(f"{'threads':<8} {'reads/s':>10} {'with writers':>13} {'writes/s':>10}")
+
+        for threads in THREADS:
+            alone, _ = run(client, threads, writing=False)
+            reads, writes = run(client, threads, writing=True)
+            print(f"{threads:<8} {alone:10.0f} {reads:13.0f} {writes:10.0f}")
+
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
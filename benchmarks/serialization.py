@@ -0,0 +1,90 @@
+"""
+Measures fetching and serializing a 100k-row read_all response before and after the fast JSON path:
+sqlite3.Row + dict(row) + Flask's default (key sorting) provider, against plain tuples zipped into dicts
++ FastJSONProvider, with the standard library encoder and with orjson when it is installed.
+Run from the project root: python -m benchmarks.serialization
+"""
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask
+from flask.json.provider import DefaultJSONProvider
+
+import models.FastJSONProvider as fast_json
+from models.ApiResponse import ApiResponse
+from models.FastJSONProvider import FastJSONProvider
+from models.SQLiteClient import SQLiteClient
+
+ROWS = 100000
+ROUNDS = 3
+
+
+def make_row(index):
+    return (f"Benchmark Bran {index}", "K", "C", 70, 4.0, 1.0, 130.0, 10.0, 5.0, 6.0, 280.0, 25.0, 3, 1.0, 0.33, 68.4)
+
+
+def legacy_read_all(database):
+    # How read_all built its rows before: a sqlite3.Row per row, copied into a dict
+    connection = sqlite3.connect(database)
+    connection.row_factory = sqlite3.Row
+    rows = connection.execute("SELECT * FROM cereals").fetchall()
+    data = [dict(row) for row in rows]
+    connection.close()
+    return ApiResponse("success", "Query executed successfully", 200, data)
+
+
+def best_of(function):
+    timings = []
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), result
+
+
+def report(label, fetch, serialize, size):
+    print(f"{label:<28} fetch {fetch * 1000:8.1f} ms   serialize {serialize * 1000:8.1f} ms   "
+          f"total {(fetch + serialize) * 1000:8.1f} ms   {size / 1e6:6.1f} MB")
+
+
+def main():
+    app = Flask(__name__)
+    default_provider = DefaultJSONProvider(app)
+    fast_provider = FastJSONProvider(app)
+
+    with tempfile.TemporaryDirectory() as directory:
+        database = os.path.join(directory, "bench.db")
+        client = SQLiteClient(database, cache_size=0)
+        client.insert_data(make_row(index) for index in range(ROWS))
+
+        print(f"read_all() of {ROWS} rows, best of {ROUNDS}")
+
+        with app.app_context():
+            fetch, result = best_of(lambda: legacy_read_all(database))
+            serialize, response = best_of(lambda: default_provider.response(result.to_dict()))
+            report("before (Row, sorted json)", fetch, serialize, len(response.get_data()))
+
+            fetch, result = best_of(client.read_all)
+            orjson = fast_json.orjson
+
+            fast_json.orjson = None
+            serialize, response = best_of(lambda: fast_provider.response(result.to_dict()))
+            report("after, json", fetch, serialize, len(response.get_data()))
+
+            fast_json.orjson = orjson
+            if orjson:
+                serialize, response = best_of(lambda: fast_provider.response(result.to_dict()))
+                report("after, orjson", fetch, serialize, len(response.get_data()))
+            else:
+                print("orjson is not installed, pip install orjson to compare it")
+
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Measures the per-request overhead of building the SQL for create/update before and after
+the statements were precomputed in SQLiteClient.
+Run from the project root: python -m benchmarks.statements
+"""
+import os
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.Cereal import Cereal
+from models.SQLiteClient import SQLiteClient
+
+ROUNDS = 100000
+ROW = ("Benchmark Bran", "K", "C", 70, 4.0, 1.0, 130.0, 10.0, 5.0, 6.0, 280.0, 25.0, 3, 1.0, 0.33, 68.4)
+
+
+class LegacyCereal:
+    # The legacy code walked the attributes of an instance __dict__, Cereal has slots instead
+    def __init__(self, name, mfr, type_, calories, protein, fat, sodium, fiber, carbo, sugars, potass, vitamins,
+                 shelf, weight, cups, rating, id=None):
+        self.id = id
+        self.name = name
+        self.mfr = mfr
+        self.type_ = type_
+        self.calories = calories
+        self.protein = protein
+        self.fat = fat
+        self.sodium = sodium
+        self.fiber = fiber
+        self.carbo = carbo
+        self.sugars = sugars
+        self.potass = potass
+        self.vitamins = vitamins
+        self.shelf = shelf
+        self.weight = weight
+        self.cups = cups
+        self.rating = rating
+
+
+def legacy_create(cereal):
+    # How create() built its query before: walk cereal.__dict__ and re-parse the verb in execute_query
+    dict_keys = cereal.__dict__.keys()
+    columns = ', '.join(key for key in dict_keys if key != 'id')
+    placeholders = ', '.join(['?'] * len([key for key in dict_keys if key != 'id']))
+    query = f"INSERT INTO cereals ({columns}) VALUES ({placeholders})"
+    data = [
+        cereal.name, cereal.mfr, cereal.type_, cereal.calories, cereal.protein, cereal.fat,
+        cereal.sodium, cereal.fiber, cereal.carbo, cereal.sugars, cereal.potass,
+        cereal.vitamins, cereal.shelf, cereal.weight, cereal.cups, cereal.rating
+    ]
+    query_type = query.strip().split(" ")[0].upper()
+    return query, data, query_type
+
+
+def legacy_update(cereal, id):
+    dict_keys = cereal.__dict__.keys()
+    assignments = ', '.join(f"{key} = ?" for key in dict_keys if key != 'id')
+    values = tuple(value for key, value in cereal.__dict__.items() if key != 'id')
+    query = f"UPDATE cereals SET {assignments} WHERE id = ?"
+    query_type = query.strip().split(" ")[0].upper()
+    return query, values + (id,), query_type
+
+
+def prepared(statement, data):
+    return statement.sql, data, statement.query_type
+
+
+def report(label, seconds, rounds):
+    print(f"{label:<32} {seconds / rounds * 1e6:8.2f} µs/request")
+
+
+def main():
+    legacy, cereal = LegacyCereal(*ROW), Cereal(*ROW)
+
+    with tempfile.TemporaryDirectory() as directory:
+        client = SQLiteClient(os.path.join(directory, "bench.db"))
+        create = client.statements["create"]
+        update = client.statements["update"]
+
+        print(f"SQL preparation overhead ({ROUNDS} rounds)")
+        report("create, before", timeit.timeit(lambda: legacy_create(legacy), number=ROUNDS), ROUNDS)
+        report("create, after", timeit.timeit(lambda: prepared(create, cereal.to_row()), number=ROUNDS), ROUNDS)
+        report("update, before", timeit.timeit(lambda: legacy_update(legacy, 1), number=ROUNDS), ROUNDS)
+        report("update, after", timeit.timeit(lambda: prepared(update, cereal.to_row() + (1,)), number=ROUNDS), ROUNDS)
+
+        rounds = 2000
+        print(f"\nEnd-to-end SQLiteClient calls ({rounds} rounds)")
+        report("create()", timeit.timeit(lambda: client.create(cereal), number=rounds), rounds)
+        report("update()", timeit.timeit(lambda: client.update(1, cereal), number=rounds), rounds)
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
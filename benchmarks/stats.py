@@ -0,0 +1,74 @@
+"""
+Compares computing per-group aggregates over 100k cereals by looping over read_all() in Python
+with SQLiteClient.stats, which works on a ColumnSnapshot of NumPy columns.
+Run from the project root: python -m benchmarks.stats
+"""
+import os
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.Cereal import Cereal
+from models.SQLiteClient import SQLiteClient
+
+ROWS = 100000
+ROUNDS = 5
+MANUFACTURERS = "AGKNPQR"
+
+
+def make_row(index):
+    return (f"Benchmark Bran {index}", MANUFACTURERS[index % len(MANUFACTURERS)], "C", 50 + index % 100,
+            4.0, 1.0, 130.0, 10.0, 5.0, float(index % 15), 280.0, 25.0, 1 + index % 3, 1.0, 0.33, (index * 7919) % 100 / 1.1)
+
+
+def python_stats(client):
+    # What a client of the API had to do before: fetch every row and group it in Python
+    groups = defaultdict(list)
+    for row in client.read_all().data:
+        groups[row["mfr"]].append(row["rating"])
+
+    return {mfr: (statistics.fmean(values), statistics.quantiles(values, n=10)[-1]) for mfr, values in groups.items()}
+
+
+def best_of(function, rounds=ROUNDS):
+    timings = []
+    for _ in range(rounds):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        client = SQLiteClient(os.path.join(directory, "bench.db"))
+        client.insert_data(make_row(index) for index in range(ROWS))
+
+        def uncached_python_stats():
+            # Clears the read cache so read_all() really runs the query every round
+            client.cache.clear()
+            python_stats(client)
+
+        print(f"avg and p90 of rating per mfr over {ROWS} rows, best of {ROUNDS}")
+        print(f"{'read_all() + Python':<28} {best_of(uncached_python_stats) * 1000:8.1f} ms")
+
+        client.snapshot = None
+        build = best_of(lambda: client._snapshot(), rounds=1)
+        print(f"{'snapshot build (first use)':<28} {build * 1000:8.1f} ms")
+
+        query = best_of(lambda: client.stats(["rating"], "mfr", ["avg", "p90"]))
+        print(f"{'stats() on the snapshot':<28} {query * 1000:8.1f} ms")
+
+        # The write listener collects the update, the next stats() applies it to a copy of the columns
+        cereal = Cereal(*make_row(ROWS))
+        write = best_of(lambda: (client.update(1, cereal), client.stats(["rating"], "mfr", ["avg", "p90"])))
+        print(f"{'update() + stats()':<28} {write * 1000:8.1f} ms")
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Compares the latency of SQLiteClient and MemoryStorage for the read operations of the API on 100k cereals,
+with the read cache disabled so every call reaches the storage.
+Run from the project root: python -m benchmarks.storage
+"""
+import os
+import random
+import sys
+import tempfile
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.Filter import Filter
+from models.MemoryStorage import MemoryStorage
+from models.SQLiteClient import SQLiteClient
+
+ROWS = 100000
+ROUNDS = 200
+MANUFACTURERS = "AGKNPQR"
+
+
+def make_row(index):
+    return (f"Benchmark Bran {index}", MANUFACTURERS[index % len(MANUFACTURERS)], "C", 50 + index % 100,
+            4.0, 1.0, 130.0, 10.0, 5.0, float(index % 15), 280.0, 25.0, 1 + index % 3, 1.0, 0.33, (index * 7919) % 100 / 1.1)
+
+
+OPERATIONS = [
+    ("read", lambda storage: storage.read(random.randint(1, ROWS))),
+    ("read_all page", lambda storage: storage.read_all(20, None)),
+    ("filter eq, limit 20", lambda storage: storage.filter([Filter("mfr", "K")], 20)),
+    ("filter 2 ranges", lambda storage: storage.filter(
+        [Filter("calories", "140", "gte"), Filter("sugars", "3", "lt")], 20)),
+    ("filter sorted", lambda storage: storage.filter([Filter("shelf", "2")], 20, sort="-rating")),
+]
+
+
+def main():
+    with tempfile.TemporaryDirectory() as directory:
+        storages = [
+            ("sqlite", SQLiteClient(os.path.join(directory, "bench.db"), cache_size=0)),
+            ("memory", MemoryStorage(cache_size=0)),
+        ]
+        for _, storage in storages:
+            storage.insert_data(make_row(index) for index in range(ROWS))
+
+        print(f"µs per call over {ROWS} rows, mean of {ROUNDS}")
+        print(f"{'':<22} {'sqlite':>10} {'memory':>10}")
+
+        for label, operation in OPERATIONS:
+            timings = [timeit.timeit(lambda: operation(storage), number=ROUNDS) / ROUNDS * 1e6
+                       for _, storage in storages]
+            print(f"{label:<22} {timings[0]:10.1f} {timings[1]:10.1f}")
+
+        for _, storage in storages:
+            storage.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,42 +1,140 @@
+import argparse
+import atexit
+import os
 import threading
-import time
 from CerealAPI import CerealAPI
-from models.Driver import Driver
-from models.SQLiteClient import SQLiteClient
+from models.Metrics import Metrics
+from models.Driver import Driver, load_baseline, print_benchmark, save_baseline
+from models.Replayer import Replayer, print_replay
+from models.Server import Server, wait_until_ready
+from models.Storage import STORAGES, create_storage
 from models.parser import Parser
 
 
 class Main:
     """
     This class is the entry point of the application
-    It initializes the Parser, SQLiteClient, CerealAPI, and Driver classes
+    It initializes the Parser, the Storage (SQLiteClient or MemoryStorage, see --storage), CerealAPI, and Driver classes
+    With --benchmark the Driver runs a load test instead of the functional tests,
+    with --replay a traffic capture is replayed instead, see parse_args.
+    With --server the API runs under a production WSGI server (see Server) instead of the Flask development server.
     """
-    def __init__(self):
+    def __init__(self, args=None):
+        self.args = args or parse_args([])
         self.parser = Parser() # Handles parsing of the CSV file
-        self.cereals = self.parser.read_csv() # Turn .csv file into a list of Cereal objects
-        self.sql_client = SQLiteClient() # Handles database operations
-        self.cereal_api = CerealAPI(self.sql_client) # Handles API operations
-        self.driver = Driver() # Tests the API
+        self.metrics = Metrics(self.args.slow_query_ms) if self.args.metrics else None # Opt-in instrumentation
+        self.storage = create_storage(self.args.storage, self.args.database, metrics=self.metrics,
+                                      group_commit_ms=self.args.group_commit_ms) # Handles database operations
+        atexit.register(self.storage.close) # Close the pooled database connections on shutdown
+        self.cereal_api = CerealAPI(self.storage, self.args.capture, self.metrics) # Handles API operations
+        quiet = self.args.benchmark or self.args.replay or self.args.serve_only
+        self.driver = Driver(f"127.0.0.1:{self.args.port}", announce=not quiet) # Tests the API
 
     def run(self):
-        sql_client = self.sql_client
-        
-        # Insert the cereals into the database
-        result = sql_client.insert_data(self.cereals)
+        # Insert the cereals into the database, skipped when the .csv file hasn't changed since the last run
+        result = self.storage.seed(self.parser)
         if result:
             print(result)
         
+        if self.args.server:
+            self.run_server()
+            return
+
         def run_flask_app():
-            self.cereal_api.app.run()
+            self.cereal_api.app.run(port=self.args.port)
         
         # To ensure that the Flask app runs in a separate thread to avoid blocking the driver
         flask_thread = threading.Thread(target=run_flask_app)
         flask_thread.start()
         
         print("Waiting for the Flask app to start...")
-        time.sleep(3) # Wait for the Flask app to start (~estimated time)
-        self.driver.test_api()  
+        wait_until_ready(self.driver.url) # Polls /ping until the app answers
+        self.run_driver()
+
+    def run_server(self):
+        args = self.args
+        server = Server(self.cereal_api.app, port=args.port, workers=args.server_workers, threads=args.server_threads,
+                        env={"CEREAL_DB": os.path.abspath(args.database),
+                             "CEREAL_STORAGE": args.storage,
+                             "CEREAL_METRICS": "1" if args.metrics else "0",
+                             "CEREAL_GROUP_COMMIT_MS": str(args.group_commit_ms or 0)})
+        server.start()
+
+        print(f"Waiting for the server ({args.server_workers} workers, {args.server_threads} threads) to start...")
+        server.wait_until_ready()
+
+        if not args.serve_only:
+            self.run_driver()
+
+        print(f"Serving on http://{server.url}, press Ctrl+C to stop")
+        server.serve_forever()
+
+    def run_driver(self):
+        if self.args.benchmark:
+            self.run_benchmark()
+        elif self.args.replay:
+            replayer = Replayer(self.driver.url, speed=self.args.speed, workers=self.args.workers)
+            print_replay(replayer.replay(self.args.replay))
+        else:
+            self.driver.test_api()
+
+    def run_benchmark(self):
+        args = self.args
+        summary = self.driver.benchmark(
+            mix=args.mix, workers=args.workers, requests_count=args.requests, duration=args.duration)
+
+        baseline = load_baseline(args.compare) if args.compare else None
+        print_benchmark(summary, baseline)
+
+        if args.save_baseline:
+            save_baseline(summary, args.save_baseline)
+            print(f"Saved benchmark baseline to {args.save_baseline}")
+
+
+def parse_mix(value):
+    # "read=50,list=20" -> {"read": 50, "list": 20}
+    mix = {}
+    for item in value.split(","):
+        operation, _, weight = item.partition("=")
+        mix[operation.strip()] = float(weight or 1)
+    return mix
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Runs the Cereal API and tests it with the Driver")
+    parser.add_argument("--benchmark", action="store_true", help="run a concurrent load test instead of the tests")
+    parser.add_argument("--workers", type=int, default=8, help="number of concurrent benchmark workers")
+    parser.add_argument("--requests", type=int, default=1000, help="number of benchmark requests")
+    parser.add_argument("--duration", type=float, help="run the benchmark for this many seconds instead")
+    parser.add_argument("--mix", type=parse_mix, help="operation weights, e.g. read=50,list=20,filter=15,create=5")
+    parser.add_argument("--save-baseline", metavar="PATH", help="save the benchmark results as a JSON baseline")
+    parser.add_argument("--compare", metavar="PATH", help="compare the benchmark results with a JSON baseline")
+    parser.add_argument("--storage", choices=STORAGES, default="sqlite",
+                        help="where the cereals are kept: the SQLite database or process memory (not persisted)")
+    parser.add_argument("--database", default="cereals.db", help="SQLite database file")
+    parser.add_argument("--port", type=int, default=5000, help="port the API listens on")
+    parser.add_argument("--server", action="store_true", help="run under a production WSGI server (waitress/gunicorn)")
+    parser.add_argument("--server-workers", type=int, default=1,
+                        help="number of server processes, more than 1 uses gunicorn")
+    parser.add_argument("--server-threads", type=int, default=8, help="number of threads per server process")
+    parser.add_argument("--serve-only", action="store_true", help="with --server: don't run the driver, just serve")
+    parser.add_argument("--metrics", action="store_true", help="collect metrics and serve them on /metrics")
+    parser.add_argument("--slow-query-ms", type=float, default=100.0,
+                        help="log queries slower than this many milliseconds (with --metrics)")
+    parser.add_argument("--group-commit-ms", type=float, metavar="MS",
+                        help="commit single writes in groups, waiting at most this many milliseconds for more writes")
+    parser.add_argument("--capture", metavar="PATH", help="record every request to a JSONL traffic capture")
+    parser.add_argument("--replay", metavar="PATH", help="replay a JSONL traffic capture instead of the tests")
+    parser.add_argument("--speed", type=float, default=1.0,
+                        help="replay speed: 1 is the original pacing, 10 is ten times faster, 0 is as fast as possible")
+    args = parser.parse_args(argv)
+
+    if args.storage == "memory" and args.server and args.server_workers > 1:
+        parser.error("--storage memory can't be shared between server processes, use --server-workers 1")
+
+    return args
+
 
 if __name__ == "__main__":
-    app = Main()
+    app = Main(parse_args())
     app.run()
@@ -2,13 +2,14 @@ from flask import jsonify
 
 
 class ApiResponse:
-    def __init__(self, status: str, action: str, status_code: int, data=None, details=None, message=None):
+    def __init__(self, status: str, action: str, status_code: int, data=None, details=None, message=None, next_cursor=None):
         self.status = status  # "success" or "error"
         self.action = action  # Optional field for the action that was performed
         self.status_code = status_code  # Always include the status code
         self.data = data  # If the response includes data, it goes here
         self.details = details  # Optional field for debugging
         self.message = message  # A message to the user
+        self.next_cursor = next_cursor  # Cursor for the next page of a paginated list, None on the last page
 
     def to_dict(self):
         response = {
@@ -17,7 +18,8 @@ class ApiResponse:
             "action": self.action,
             "status_code": self.status_code,
             "data": self.data,  # Data will be skipped if it's not provided
-            "details": self.details  # Same for details
+            "details": self.details,  # Same for details
+            "next_cursor": self.next_cursor
         }
 
         # Remove None values from the response dictionary
@@ -41,5 +43,6 @@ class ApiResponse:
             status_code=data.get('status_code'),
             data=data.get('data'),
             details=data.get('details'),
-            message=data.get('message')
+            message=data.get('message'),
+            next_cursor=data.get('next_cursor')
         )
@@ -0,0 +1,89 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from typing import List
+from models.ApiResponse import ApiResponse
+from models.Cereal import Cereal
+from models.ColumnSnapshot import DEFAULT_AGGREGATES
+from models.Filter import Filter
+from models.Storage import Storage
+from utils import DEFAULT_PAGE_SIZE
+
+
+class AsyncSQLiteClient:
+    """
+    This class is the asyncio version of a Storage (SQLiteClient or MemoryStorage), used by AsyncCerealAPI.
+    sqlite3 calls block, so every operation runs on a dedicated thread pool (one thread per pooled connection,
+    see Storage.concurrency) and the event loop only awaits the result.
+    That way the loop keeps serving other clients while a query runs.
+    Every method returns the same ApiResponse as the Storage method with the same name.
+    """
+    def __init__(self, sql_client: Storage):
+        self.sql_client = sql_client
+        self.executor = ThreadPoolExecutor(max_workers=sql_client.concurrency, thread_name_prefix="sqlite")
+
+    @property
+    def version(self) -> int:
+        return self.sql_client.version
+
+    async def _run(self, function, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, function, *args)
+
+    async def create(self, cereal: Cereal) -> ApiResponse:
+        return await self._run(self.sql_client.create, cereal)
+
+    async def read_all(self, limit: int = None, cursor: str = None, fields: List[str] = None) -> ApiResponse:
+        return await self._run(self.sql_client.read_all, limit, cursor, fields)
+
+    async def read(self, id: int, fields: List[str] = None) -> ApiResponse:
+        return await self._run(self.sql_client.read, id, fields)
+
+    async def update(self, id: int, cereal: Cereal) -> ApiResponse:
+        return await self._run(self.sql_client.update, id, cereal)
+
+    async def delete(self, id: int) -> ApiResponse:
+        return await self._run(self.sql_client.delete, id)
+
+    async def filter(self, filters: List[Filter], limit: int = None, cursor: str = None,
+                     sort: str = None, fields: List[str] = None) -> ApiResponse:
+        return await self._run(self.sql_client.filter, filters, limit, cursor, sort, fields)
+
+    async def similar(self, id: int, k: int = 10) -> ApiResponse:
+        return await self._run(self.sql_client.similar, id, k)
+
+    async def search(self, match: str, filters: List[Filter] = None, limit: int = DEFAULT_PAGE_SIZE) -> ApiResponse:
+        return await self._run(self.sql_client.search, match, filters, limit)
+
+    async def stats(self, fields: List[str], group_by: str = None, aggregates=DEFAULT_AGGREGATES,
+                    filters: List[Filter] = None, top: int = None) -> ApiResponse:
+        return await self._run(self.sql_client.stats, fields, group_by, aggregates, filters, top)
+
+    async def batch(self, operations: list) -> ApiResponse:
+        return await self._run(self.sql_client.batch, operations)
+
+    async def cache_stats(self) -> ApiResponse:
+        return self.sql_client.cache_stats()
+
+    async def stream(self, filters: List[Filter] = None, batch_size: int = 500):
+        """
+        Async generator over every (matching) cereal by id, in lists of at most batch_size dicts.
+        Every batch is its own keyset query on the thread pool (Storage.stream_page), so between batches
+        a slow client holds neither a connection nor a thread. Raises RuntimeError if a query fails.
+        """
+        cursor = None
+        while True:
+            result = await self._run(self.sql_client.stream_page, filters, batch_size, cursor)
+            if result.status_code == 404:
+                return
+            if result.status_code != 200:
+                raise RuntimeError(result.action)
+
+            yield result.data
+
+            cursor = result.next_cursor
+            if cursor is None:
+                return
+
+    def close(self):
+        self.executor.shutdown(wait=True)
+        self.sql_client.close()
@@ -1,20 +1,54 @@
+import math
 from enum import Enum
+from operator import attrgetter
 
 
 class Cereal:
+    """
+    A cereal with one slot per field, so instances have no per-instance __dict__.
+    FIELDS is the schema: database column -> (API name, type, default). It drives COLUMNS,
+    the type coercion in from_dict, to_dict and the filterable fields (models.Filter).
+    """
+    FIELDS = {
+        "name": ("name", str, None),
+        "mfr": ("mfr", str, None),
+        "type_": ("type", str, None),
+        "calories": ("calories", int, 0),
+        "protein": ("protein", float, 0.0),
+        "fat": ("fat", float, 0.0),
+        "sodium": ("sodium", float, 0.0),
+        "fiber": ("fiber", float, 0.0),
+        "carbo": ("carbo", float, 0.0),
+        "sugars": ("sugars", float, 0.0),
+        "potass": ("potass", float, 0.0),
+        "vitamins": ("vitamins", float, 0.0),
+        "shelf": ("shelf", int, 0),
+        "weight": ("weight", float, 0.0),
+        "cups": ("cups", float, 0.0),
+        "rating": ("rating", float, 0.0),
+    }
+
+    # Database columns in the order they are bound in INSERT and UPDATE statements ('id' is assigned by the database)
+    COLUMNS = tuple(FIELDS)
+
+    # Fields the API requires in from_dict
+    REQUIRED = ("name", "mfr", "type")
+
+    __slots__ = ("id",) + COLUMNS
+
     def __init__(self,
                  name: str,
                  mfr: str,
                  type_: str,
                  calories: int = 0,
-                 protein: int = 0,
-                 fat: int = 0,
-                 sodium: int = 0,
+                 protein: float = 0.0,
+                 fat: float = 0.0,
+                 sodium: float = 0.0,
                  fiber: float = 0.0,
                  carbo: float = 0.0,
-                 sugars: int = 0,
-                 potass: int = 0,
-                 vitamins: int = 0,
+                 sugars: float = 0.0,
+                 potass: float = 0.0,
+                 vitamins: float = 0.0,
                  shelf: int = 0,
                  weight: float = 0.0,
                  cups: float = 0.0,
@@ -41,34 +75,65 @@ class Cereal:
 
     @classmethod
     def from_dict(cls, data):
-        if 'name' not in data or 'mfr' not in data or 'type' not in data:
+        """Builds a Cereal from a request body, converting every value to the type of its field."""
+        if not data.keys() >= _REQUIRED:
             raise ValueError(
                 "Missing required fields: 'name', 'mfr', and 'type' are mandatory.")
 
-        return cls(
-            id=data.get('id'),  # Optional id field
-            name=data.get('name'),
-            mfr=data.get('mfr'),
-            type_=data.get('type'),
-            calories=data.get('calories', 0),
-            protein=data.get('protein', 0),
-            fat=data.get('fat', 0),
-            sodium=data.get('sodium', 0),
-            fiber=data.get('fiber', 0.0),
-            carbo=data.get('carbo', 0.0),
-            sugars=data.get('sugars', 0),
-            potass=data.get('potass', 0),
-            vitamins=data.get('vitamins', 0),
-            shelf=data.get('shelf', 0),
-            weight=data.get('weight', 0.0),
-            cups=data.get('cups', 0.0),
-            rating=data.get('rating', 0.0)
-        )
+        get = data.get
+        values = []
+        for field, type_, default in _SCHEMA:
+            value = get(field, default)
+            if type(value) is not type_ and value is not None:
+                # A whole number sent for a float field is the common case, the rest goes through coerce
+                value = float(value) if type_ is float and type(value) is int else coerce(field, type_, value)
+            values.append(value)
+
+        return cls(*values, id=get('id'))  # Optional id field
+
+    def to_row(self):
+        # The values of the object in COLUMNS order, ready to be bound to a prepared statement
+        return _row(self)
 
     def to_dict(self):
-        # Convert the object's attributes to a dictionary, excluding 'id'
-        return {key: value for key, value in self.__dict__.items() if key != 'id'}
-    
+        # The object's fields by column name, excluding 'id'
+        return dict(zip(self.COLUMNS, _row(self)))
+
+
+_row = attrgetter(*Cereal.COLUMNS)
+
+# FIELDS.values() and REQUIRED as from_dict walks them, computed once instead of on every request body
+_SCHEMA = tuple(Cereal.FIELDS.values())
+_REQUIRED = frozenset(Cereal.REQUIRED)
+
+
+def coerce(field: str, type_: type, value):
+    """Converts a value from a request body to the type of its field, None is kept."""
+    if value is None or type(value) is type_:
+        return value
+
+    if type_ is float and type(value) is int:
+        return float(value)
+
+    if type_ is str or isinstance(value, (bool, list, dict)):
+        raise ValueError(f"Field '{field}' must be of type {type_.__name__}")
+
+    try:
+        number = float(value)  # Numbers and numeric strings
+    except ValueError:
+        number = math.nan
+
+    if not math.isfinite(number):
+        raise ValueError(f"Field '{field}' must be of type {type_.__name__}")
+
+    # An int field accepts a whole float (70.0) but not a fraction
+    if type_ is int:
+        if not number.is_integer():
+            raise ValueError(f"Field '{field}' must be a whole number")
+        return int(number)
+
+    return number
+
 class Categorical(Enum):
     A = "American Home Food Products"
     G = "General Mills"
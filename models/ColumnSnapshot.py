@@ -0,0 +1,234 @@
+import operator
+import re
+from typing import List
+import numpy as np
+from models.Cereal import Cereal
+from models.Filter import FILTERABLE_FIELDS, Filter
+
+# Aggregates for GET /cereals/stats, besides the percentiles (p50, p90, p99.9, ...)
+AGGREGATES = ("count", "sum", "avg", "min", "max", "std")
+PERCENTILE = re.compile(r"^p(100|\d{1,2}(\.\d+)?)$")
+DEFAULT_AGGREGATES = ("avg", "min", "max", "p50")
+
+# Filter operator -> comparison on a column array, prefix and in are handled in _mask
+COMPARISONS = {
+    "eq": operator.eq,
+    "ne": operator.ne,
+    "lt": operator.lt,
+    "lte": operator.le,
+    "gt": operator.gt,
+    "gte": operator.ge,
+}
+
+
+class ColumnSnapshot:
+    """
+    This class is a column-oriented copy of the cereals table, one NumPy array per column, for GET /cereals/stats.
+    Filters become boolean masks and the aggregates are computed for every group at once:
+    the rows are sorted by (group, value) with one lexsort, so every group is a contiguous, ordered slice
+    and count/sum/avg/std come from bincount, min/max/percentiles from indexing into the sorted values.
+    Numeric columns are float64 with NaN for NULL, text columns are fixed-width strings with a separate NULL mask.
+    NULLs are skipped by the aggregates and don't match any filter, like in SQL.
+    The snapshot is immutable: Storage loads it once, then apply() makes a new one with the single-row writes.
+    """
+    def __init__(self, rows: List[tuple]):
+        # rows are (id, *Cereal.COLUMNS) tuples
+        self.size = len(rows)
+        self.columns = {}
+        self.nulls = {}
+        self._groups = {}
+
+        values = list(zip(*rows)) if rows else [()] * (len(Cereal.COLUMNS) + 1)
+        self.ids = np.array(values[0], dtype=np.int64)
+
+        for column, column_values in zip(Cereal.COLUMNS, values[1:]):
+            type_ = Cereal.FIELDS[column][1]
+
+            if type_ is str:
+                strings = np.array(column_values, dtype=object)
+                self.nulls[column] = np.equal(strings, None)
+                strings[self.nulls[column]] = ""
+                self.columns[column] = strings.astype(str)
+            else:
+                self.columns[column] = np.array(column_values, dtype=np.float64)  # None becomes NaN
+                self.nulls[column] = np.isnan(self.columns[column])
+
+    def apply(self, changes: List[tuple]) -> "ColumnSnapshot":
+        """
+        Returns a new snapshot with the writes applied, changes are (op, id, row) as the write listeners get them
+        ("create" or "update" with the row in Cereal.COLUMNS order, "delete"). The last change of an id wins,
+        and a write the snapshot already has is applied again harmlessly. The rows stay in id order:
+        a row of a known id is replaced in place, a new one is inserted at its id.
+        """
+        latest = {id: (None if op == "delete" else row) for op, id, row in changes}
+        rows = ColumnSnapshot(sorted((id, *row) for id, row in latest.items() if row is not None))
+        deleted = [id for id, row in latest.items() if row is None]
+
+        positions = np.searchsorted(self.ids, rows.ids)
+        found = positions < self.size
+        found[found] = self.ids[positions[found]] == rows.ids[found]
+        keep = ~np.isin(self.ids, deleted) if deleted else None
+        kept_ids = self.ids[keep] if deleted else self.ids
+        inserts = np.searchsorted(kept_ids, rows.ids[~found])
+
+        def merge(current, new):
+            merged = current.astype(np.result_type(current, new))  # A copy, wide enough for longer strings
+            merged[positions[found]] = new[found]
+            if deleted:
+                merged = merged[keep]
+            return np.insert(merged, inserts, new[~found]) if len(inserts) else merged
+
+        snapshot = ColumnSnapshot([])
+        snapshot.ids = merge(self.ids, rows.ids)
+        snapshot.size = len(snapshot.ids)
+
+        for column in Cereal.COLUMNS:
+            snapshot.columns[column] = merge(self.columns[column], rows.columns[column])
+            snapshot.nulls[column] = merge(self.nulls[column], rows.nulls[column])
+
+        return snapshot
+
+    def _mask(self, filters: List[Filter]):
+        mask = np.ones(self.size, dtype=bool)
+
+        for f in filters:
+            values = self.columns[f.column]
+
+            if f.operator == "in":
+                condition = np.isin(values, list(f.value))
+            elif f.operator == "prefix":
+                condition = np.char.startswith(values, f.value)
+            else:
+                condition = COMPARISONS[f.operator](values, f.value)
+
+            mask &= condition & ~self.nulls[f.column]
+
+        return mask
+
+    def _group_codes(self, column):
+        # (group keys, group code of every row), cached because the snapshot doesn't change
+        if column not in self._groups:
+            keys, codes = np.unique(self.columns[column], return_inverse=True)
+            self._groups[column] = (keys, codes)
+
+        return self._groups[column]
+
+    def aggregate(self, fields: List[str], group_by: str = None, aggregates=DEFAULT_AGGREGATES,
+                  filters: List[Filter] = None, top: int = None) -> dict:
+        """
+        Returns {"groups": [...]} with one entry per group (a single entry without group_by).
+        Every entry has the group value, the row count and a dict of aggregates for each field.
+        With top, every entry also lists the top rows (id, name and the field) by the first field, highest first.
+        """
+        mask = self._mask(filters or [])
+
+        if group_by:
+            group_column = FILTERABLE_FIELDS[group_by][0]
+            keys, codes = self._group_codes(group_column)
+            codes = codes[mask]
+            # Only the groups with rows left after the filters
+            present = np.flatnonzero(np.bincount(codes, minlength=len(keys)))
+            keys, codes = keys[present], np.searchsorted(present, codes)
+        else:
+            keys, codes = np.array([None], dtype=object), np.zeros(int(mask.sum()), dtype=np.int64)
+
+        counts = np.bincount(codes, minlength=len(keys))
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+        groups = [{"count": int(count)} for count in counts]
+
+        if group_by:
+            nulls = self.nulls[group_column][mask]
+            null_codes = set(np.unique(codes[nulls]).tolist())
+            for index, (group, key) in enumerate(zip(groups, keys.tolist())):
+                group[group_by] = None if index in null_codes else field_value(group_by, key)
+
+        for field in fields:
+            values = self.columns[FILTERABLE_FIELDS[field][0]][mask]
+            results = self._aggregate_field(values, codes, counts, starts, aggregates)
+            for index, group in enumerate(groups):
+                group[field] = {name: none_if_nan(result[index]) for name, result in results.items()}
+                if "count" in results:
+                    group[field]["count"] = int(results["count"][index])
+
+        if top:
+            self._top(groups, fields[0], mask, codes, starts, top)
+
+        return {"groups": groups}
+
+    def _aggregate_field(self, values, codes, counts, starts, aggregates) -> dict:
+        valid = ~np.isnan(values)
+        present = np.bincount(codes, weights=valid, minlength=len(counts))  # Non-NULL values per group
+        zeroed = np.where(valid, values, 0.0)
+        sums = np.bincount(codes, weights=zeroed, minlength=len(counts))
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            averages = sums / present
+
+        # Ascending values inside each group, NaN sorts last so a group's values are its first `present` rows
+        ordered = values[np.lexsort((values, codes))]
+        results = {}
+
+        for name in aggregates:
+            if name == "count":
+                results[name] = present
+            elif name == "sum":
+                results[name] = np.where(present > 0, sums, np.nan)
+            elif name == "avg":
+                results[name] = averages
+            elif name == "std":
+                squares = np.bincount(codes, weights=zeroed * zeroed, minlength=len(counts))
+                with np.errstate(invalid="ignore", divide="ignore"):
+                    results[name] = np.sqrt(np.maximum(squares / present - averages * averages, 0.0))
+            elif name == "min":
+                results[name] = self._ordered_at(ordered, starts, present, 0.0)
+            elif name == "max":
+                results[name] = self._ordered_at(ordered, starts, present, 100.0)
+            else:
+                results[name] = self._ordered_at(ordered, starts, present, float(name[1:]))
+
+        return results
+
+    def _ordered_at(self, ordered, starts, present, percentile: float):
+        # The percentile of every group with linear interpolation (NumPy's default method), NaN for empty groups
+        if not len(ordered):
+            return np.full(len(starts), np.nan)
+
+        position = np.maximum(present - 1, 0) * percentile / 100
+        lower = np.floor(position).astype(np.int64)
+        upper = np.ceil(position).astype(np.int64)
+        low = ordered[starts + lower]
+        high = ordered[starts + upper]
+
+        return np.where(present > 0, low + (high - low) * (position - lower), np.nan)
+
+    def _top(self, groups, field, mask, codes, starts, top: int):
+        values = self.columns[FILTERABLE_FIELDS[field][0]][mask]
+        names = self.columns["name"][mask]
+        ids = self.ids[mask]
+
+        # Descending values inside each group (NaN last), then the first `top` rows of every group
+        order = np.lexsort((-values, codes))
+        rank = np.arange(len(order)) - starts[codes[order]]
+        selected = order[(rank < top) & ~np.isnan(values[order])]
+
+        for group in groups:
+            group["top"] = []
+
+        for index in selected.tolist():
+            row = {"id": int(ids[index]), "name": str(names[index]), field: field_value(field, values[index])}
+            groups[codes[index]]["top"].append(row)
+
+
+def none_if_nan(value):
+    value = float(value)
+    return None if np.isnan(value) else value
+
+
+def field_value(field: str, value):
+    # A value from a column array as the JSON type of the field (the numeric arrays are all float64)
+    type_ = FILTERABLE_FIELDS[field][1]
+    if type_ is str:
+        return str(value)
+
+    value = none_if_nan(value)
+    return int(value) if type_ is int and value is not None else value
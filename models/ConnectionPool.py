@@ -0,0 +1,132 @@
+import pathlib
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+
+# Pragmas applied to every new connection. WAL lets readers and the writer work at the same time,
+# synchronous=NORMAL is safe in WAL mode and avoids an fsync per commit,
+# cache_size is in KiB when negative (here 16 MB) and mmap_size is in bytes (here 256 MB).
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -16000,
+    "mmap_size": 268435456,
+    "temp_store": "MEMORY",
+    "busy_timeout": 5000,
+}
+
+
+class ConnectionPool:
+    """
+    This class keeps a bounded pool of open SQLite connections that are reused between queries.
+    A connection is only opened the first time a slot in the pool is needed,
+    after that it is borrowed from the pool and handed back when the caller is done with it.
+    If every connection is in use the caller waits (up to timeout seconds) for one to be released.
+    close() shuts the pool down: idle connections are closed right away and borrowed ones when they are released.
+    With read_only the connections are opened with mode=ro, so they can't write and never take the write lock.
+    The database has to exist already, in WAL mode they read the last committed state while a write is in progress.
+    """
+    def __init__(self, database: str = "cereals.db", size: int = 5, timeout: float = 30.0, pragmas: dict = None,
+                 metrics=None, read_only: bool = False):
+        if size < 1:
+            raise ValueError("Pool size must be at least 1")
+
+        self.database = database
+        self.size = size
+        self.read_only = read_only
+        self.timeout = timeout
+        self.pragmas = {**DEFAULT_PRAGMAS, **(pragmas or {})}
+        self._idle = queue.LifoQueue(maxsize=size)  # LIFO keeps the most recently used (warm) connection on top
+        self._lock = threading.Lock()
+        self._opened = 0
+        self._closed = False
+        self.metrics = metrics  # Optional Metrics, counts the connections that are opened
+
+    def _open(self) -> sqlite3.Connection:
+        # check_same_thread is disabled because a connection may be borrowed by different threads over its lifetime,
+        # the pool makes sure only one thread uses it at a time
+        if self.read_only:
+            uri = pathlib.Path(self.database).absolute().as_uri() + "?mode=ro"
+            connection = sqlite3.connect(uri, timeout=self.timeout, check_same_thread=False, uri=True)
+        else:
+            connection = sqlite3.connect(self.database, timeout=self.timeout, check_same_thread=False)
+        connection.row_factory = sqlite3.Row
+
+        if self.metrics:
+            self.metrics.count_connection_open()
+
+        for pragma, value in self.pragmas.items():
+            connection.execute(f"PRAGMA {pragma} = {value}")
+
+        return connection
+
+    def acquire(self) -> sqlite3.Connection:
+        if self._closed:
+            raise sqlite3.ProgrammingError("Connection pool is closed")
+
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+
+        if can_open:
+            try:
+                return self._open()
+            except Exception:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=self.timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Timed out waiting for a database connection")
+
+    def release(self, connection: sqlite3.Connection):
+        if self._closed:
+            self._discard(connection)
+            return
+
+        self._idle.put_nowait(connection)
+
+    def _discard(self, connection: sqlite3.Connection):
+        connection.close()
+        with self._lock:
+            self._opened -= 1
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the duration of a with-block.
+        The block runs as one transaction: it is committed on success and rolled back on an exception.
+        """
+        connection = self.acquire()
+        try:
+            with connection:
+                yield connection
+        finally:
+            self.release(connection)
+
+    def close(self):
+        self._closed = True
+
+        while True:
+            try:
+                connection = self._idle.get_nowait()
+            except queue.Empty:
+                break
+
+            # Lets SQLite refresh the planner statistics for the indexes the queries on this connection used
+            try:
+                connection.execute("PRAGMA optimize")
+            except sqlite3.Error:
+                pass
+
+            self._discard(connection)
@@ -1,6 +1,11 @@
 
+import json
+import random
+import threading
 import time
 import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
 
 from models.ApiResponse import ApiResponse
 
@@ -8,17 +13,28 @@ from models.ApiResponse import ApiResponse
 # But this is just for testing purposes
 password = "test_password"
 
+# Default operation mix for benchmark(): operation -> relative weight
+DEFAULT_MIX = {
+    "read": 50,
+    "list": 20,
+    "filter": 15,
+    "create": 5,
+    "update": 5,
+    "delete": 5,
+}
+
 
 class Driver():
     """
     This class is used to test the API
     I don't know if it's reasonable,
     instead of using a testing framework like pytest?
+    test_api runs the functional tests, benchmark runs a concurrent load test.
     """
 
-    def __init__(self):
+    def __init__(self, url="127.0.0.1:5000", announce=True):
         # Set the URL and headers for the API requests
-        self.url = "127.0.0.1:5000"
+        self.url = url
         self.headers = {
             "Content-Type": "application/json",
             "Accept": "application/json"
@@ -43,7 +59,11 @@ class Driver():
             "password": password
         }
 
-        self._initialize()
+        # Keep-alive connections are reused between requests instead of opening a new one every time
+        self.session = requests.Session()
+
+        if announce:
+            self._initialize()
 
     def _initialize(self):
         print("Driver initialized. \n")
@@ -158,10 +178,108 @@ class Driver():
 
         return verify_status_code(response.get("status_code"), expected_status_code, response)
 
+    def benchmark(self, mix=None, workers=8, requests_count=1000, duration=None, seed=None):
+        """
+        Replays a weighted mix of operations (read, list, filter, create, update, delete) from concurrent workers.
+        Every worker has its own pooled requests.Session, so connections are kept alive.
+        Runs until requests_count requests are sent, or for duration seconds if it is given.
+        Updates and deletes only touch cereals created by the benchmark itself.
+        Returns a summary with req/s and p50/p95/p99 latency per operation, see print_benchmark.
+        """
+        mix = mix or DEFAULT_MIX
+        operations = list(mix)
+        weights = [mix[operation] for operation in operations]
+
+        ids = self._benchmark_ids()
+        created = []
+        created_lock = threading.Lock()
+        samples = []
+        samples_lock = threading.Lock()
+        remaining = [requests_count]
+        deadline = time.perf_counter() + duration if duration else None
+
+        def next_request():
+            if deadline:
+                return time.perf_counter() < deadline
+
+            with samples_lock:
+                remaining[0] -= 1
+                return remaining[0] >= 0
+
+        def worker(number):
+            rng = random.Random(None if seed is None else seed + number)
+            session = requests.Session()
+            session.mount("http://", HTTPAdapter(pool_connections=1, pool_maxsize=1))
+            worker_samples = []
+
+            while next_request():
+                operation = rng.choices(operations, weights)[0]
+                method, endpoint, data = self._benchmark_request(operation, rng, ids, created, created_lock)
+
+                start = time.perf_counter()
+                try:
+                    response = session.request(method, endpoint, json=data, headers=self.headers)
+                    status_code = response.status_code
+                    body = response.json()
+                except Exception:
+                    status_code, body = None, {}
+                latency = time.perf_counter() - start
+
+                if operation == "create" and status_code == 201 and body.get("data"):
+                    with created_lock:
+                        created.append(body["data"]["id"])
+
+                worker_samples.append((operation, status_code, latency))
+
+            session.close()
+            with samples_lock:
+                samples.extend(worker_samples)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            list(executor.map(worker, range(workers)))
+        elapsed = time.perf_counter() - start
+
+        return summarize(samples, elapsed, workers)
+
+    def _benchmark_ids(self):
+        # The ids of the existing cereals, read operations pick from these
+        response = self.send_request(f"http://{self.url}/cereals?fields=id&limit=1000", "GET")
+        ids = [row["id"] for row in response.get("data") or []]
+        return ids or [1]
+
+    def _benchmark_request(self, operation, rng, ids, created, created_lock):
+        """Returns (method, endpoint, data) for one benchmark operation."""
+        base = f"http://{self.url}/cereals"
+
+        if operation == "read":
+            return "GET", f"{base}/{rng.choice(ids)}", None
+
+        if operation == "list":
+            return "GET", base, None
+
+        if operation == "filter":
+            return "GET", f"{base}?{rng.choice(BENCHMARK_FILTERS)}", None
+
+        if operation in ("update", "delete"):
+            id = None
+            with created_lock:
+                if created:
+                    # A deleted id is removed from the list so it isn't deleted twice
+                    id = created.pop(rng.randrange(len(created))) if operation == "delete" else rng.choice(created)
+
+            if id is not None:
+                if operation == "delete":
+                    return "DELETE", f"{base}/{id}", {"password": password}
+                return "POST", f"{base}/{id}", self.prototype_object
+
+        # create, or an update/delete before the benchmark created anything
+        return "POST", base, self.prototype_object
+
     def send_request(self, endpoint, method, data=None):
         try:
             # Generic method to send requests to the API
-            response = requests.request(
+            response = self.session.request(
                 method, endpoint, json=data, headers=self.headers)
             return response.json()
 
@@ -169,6 +287,94 @@ class Driver():
             return {"status": "error", "message": str(e)}
 
 
+# Query strings used by the "filter" benchmark operation
+BENCHMARK_FILTERS = [
+    "mfr=K",
+    "mfr=P&shelf=3",
+    "calories__lt=100",
+    "rating__gte=50&sort=-rating",
+    "name__prefix=C",
+    "mfr__in=G,Q&fields=name,rating",
+]
+
+
+def percentile(values, p):
+    # Nearest-rank percentile of a sorted list
+    if not values:
+        return 0.0
+
+    index = max(0, min(len(values) - 1, round(p / 100 * len(values)) - 1))
+    return values[index]
+
+
+def summarize(samples, elapsed, workers):
+    """Builds the benchmark summary: totals plus count, errors, req/s and latency percentiles (ms) per operation."""
+    summary = {
+        "workers": workers,
+        "requests": len(samples),
+        "elapsed": elapsed,
+        "requests_per_second": len(samples) / elapsed if elapsed else 0.0,
+        "errors": sum(1 for _, status_code, _ in samples if status_code is None or status_code >= 500),
+        "operations": {},
+    }
+
+    for operation in sorted({operation for operation, _, _ in samples}):
+        latencies = sorted(latency * 1000 for op, _, latency in samples if op == operation)
+        errors = sum(1 for op, status_code, _ in samples if op == operation and (status_code is None or status_code >= 500))
+
+        summary["operations"][operation] = {
+            "count": len(latencies),
+            "errors": errors,
+            "requests_per_second": len(latencies) / elapsed if elapsed else 0.0,
+            "mean_ms": sum(latencies) / len(latencies),
+            "p50_ms": percentile(latencies, 50),
+            "p95_ms": percentile(latencies, 95),
+            "p99_ms": percentile(latencies, 99),
+        }
+
+    return summary
+
+
+def print_benchmark(summary, baseline=None):
+    """Prints the summary, and the change in req/s and p95 against a baseline summary if one is given."""
+    print(f"Benchmark: {summary['requests']} requests from {summary['workers']} workers "
+          f"in {summary['elapsed']:.2f}s ({summary['requests_per_second']:.1f} req/s, {summary['errors']} errors)")
+
+    width = max([10] + [len(operation) for operation in summary["operations"]])
+    header = f"{'operation':<{width}} {'count':>7} {'errors':>7} {'req/s':>9} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}"
+    if baseline:
+        header += f" {'Δ req/s':>9} {'Δ p95':>9}"
+    print(header)
+
+    for operation, stats in summary["operations"].items():
+        line = (f"{operation:<{width}} {stats['count']:>7} {stats['errors']:>7} {stats['requests_per_second']:>9.1f} "
+                f"{stats['mean_ms']:>9.2f} {stats['p50_ms']:>9.2f} {stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}")
+
+        previous = (baseline or {}).get("operations", {}).get(operation)
+        if previous:
+            line += (f" {relative_change(stats['requests_per_second'], previous['requests_per_second']):>9}"
+                     f" {relative_change(stats['p95_ms'], previous['p95_ms']):>9}")
+
+        print(line)
+
+
+def relative_change(value, previous):
+    if not previous:
+        return "n/a"
+
+    return f"{(value - previous) / previous * 100:+.1f}%"
+
+
+def save_baseline(summary, path):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+
+
+def load_baseline(path):
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
 def sleep():
     interval = 1
     time.sleep(interval)
@@ -187,7 +393,7 @@ def print_results(results):
         else:
             result_text = f"Failed ❌"
 
-        message += f"Test #{tests}: {result_text} > {result.get("message")} \n"
+        message += f"Test #{tests}: {result_text} > {result.get('message')} \n"
 
     print(message)
 
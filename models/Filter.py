@@ -1,4 +1,72 @@
+from models.Cereal import Cereal
+
+# Fields that can be filtered and sorted on: API name -> (database column, type of the values), from the Cereal schema
+FILTERABLE_FIELDS = {name: (column, type_) for column, (name, type_, _) in Cereal.FIELDS.items()}
+
+# Operator suffix (e.g. calories__lt) -> SQL comparison, prefix and in are built separately in to_sql
+OPERATORS = {
+    "eq": "=",
+    "ne": "!=",
+    "lt": "<",
+    "lte": "<=",
+    "gt": ">",
+    "gte": ">=",
+    "prefix": None,
+    "in": None,
+}
+
+MAX_IN_VALUES = 100
+
+
 class Filter:
-    def __init__(self, field, value):
+    """
+    A single condition on a filterable field, parsed from a query parameter like calories__lt=100.
+    The value is converted to the type of the field, for 'in' it is a comma-separated list of values.
+    """
+    def __init__(self, field, value, operator="eq"):
+        if field not in FILTERABLE_FIELDS:
+            raise ValueError(f"Unknown filter field '{field}'")
+
+        if operator not in OPERATORS:
+            raise ValueError(f"Unknown filter operator '{operator}', use one of: {', '.join(OPERATORS)}")
+
         self.field = field
-        self.value = value
\ No newline at end of file
+        self.operator = operator
+        self.column, self.type = FILTERABLE_FIELDS[field]
+
+        if operator == "prefix" and self.type is not str:
+            raise ValueError(f"The prefix operator only works on text fields, not '{field}'")
+
+        if operator == "in":
+            values = value.split(",") if isinstance(value, str) else list(value)
+            if len(values) > MAX_IN_VALUES:
+                raise ValueError(f"At most {MAX_IN_VALUES} values are allowed for '{field}__in'")
+            self.value = tuple(self._coerce(v) for v in values)
+        else:
+            self.value = self._coerce(value)
+
+        if operator == "prefix" and not self.value:
+            raise ValueError(f"The prefix for '{field}' must not be empty")
+
+    def _coerce(self, value):
+        try:
+            return self.type(value.strip() if isinstance(value, str) else value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value '{value}' for filter field '{self.field}'")
+
+    def key(self):
+        # Hashable identity of the filter, used for cache keys
+        return (self.field, self.operator, self.value)
+
+    def to_sql(self):
+        """Returns the SQL condition and its parameters."""
+        if self.operator == "in":
+            placeholders = ", ".join(["?"] * len(self.value))
+            return f"{self.column} IN ({placeholders})", self.value
+
+        if self.operator == "prefix":
+            # A range instead of LIKE, so the index on the column is used (LIKE is case-insensitive and can't use it)
+            upper = self.value[:-1] + chr(ord(self.value[-1]) + 1)
+            return f"{self.column} >= ? AND {self.column} < ?", (self.value, upper)
+
+        return f"{self.column} {OPERATORS[self.operator]} ?", (self.value,)
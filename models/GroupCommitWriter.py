@@ -0,0 +1,95 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from models.ApiResponse import ApiResponse
+from utils import MAX_BATCH_SIZE
+
+
+class GroupCommitWriter:
+    """
+    This class commits single writes in groups (group commit), for SQLiteClient's group_commit_ms option.
+    create, update and delete put their operation on a queue and wait, a single writer thread takes
+    everything that arrives within max_delay seconds of the first waiting operation (at most max_batch)
+    and runs it as one SQLiteClient.batch transaction, so many writers share one commit (and fsync).
+    Every caller still gets the ApiResponse the direct method would have returned, with its own status and id,
+    once its group has been committed. A failed transaction fails every operation of the group.
+    close() commits what is still queued and stops the thread.
+    """
+    def __init__(self, sql_client, max_delay: float = 0.002, max_batch: int = MAX_BATCH_SIZE):
+        self.sql_client = sql_client
+        self.max_delay = max_delay
+        self.max_batch = max_batch
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()  # Orders submit() with close(), nothing is queued after the stop sentinel
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name="group-commit", daemon=True)
+        self._thread.start()
+
+    def submit(self, op: str, id: int = None, cereal=None) -> ApiResponse:
+        """Queues one (op, id, cereal) operation, see SQLiteClient.batch, and waits until its group is committed."""
+        future = Future()
+
+        with self._lock:
+            if self._closed:
+                return ApiResponse("error", "Database query failed", 500, details="Group commit writer is closed")
+            self._queue.put(((op, id, cereal), future))
+
+        return future.result()
+
+    def _run(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+
+            group = [item]
+            deadline = time.monotonic() + self.max_delay
+            closing = False
+
+            while len(group) < self.max_batch:
+                try:
+                    item = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+                except queue.Empty:
+                    break
+                if item is None:
+                    closing = True
+                    break
+                group.append(item)
+
+            self._commit(group)
+
+            if closing:
+                return
+
+    def _commit(self, group: list):
+        try:
+            result = self.sql_client.batch([operation for operation, _ in group])
+        except Exception as e:
+            result = ApiResponse("error", "Database query failed", 500, details=str(e))
+
+        for index, (_, future) in enumerate(group):
+            future.set_result(as_response(result.data[index]) if result.status_code == 200 else result)
+
+    def close(self):
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            self._queue.put(None)
+
+        self._thread.join()
+
+
+def as_response(item: dict) -> ApiResponse:
+    # One item of a batch result -> the response of the matching create/update/delete method
+    if item["status_code"] == 404:
+        return ApiResponse("error", "Cereal not found", 404)
+
+    if item["op"] == "create":
+        return ApiResponse("success", "Resource created successfully", 201, {"id": item["id"]})
+
+    if item["op"] == "update":
+        return ApiResponse("success", "Resource updated successfully", 201)
+
+    return ApiResponse("success", "Resource deleted successfully", 200, message="Deleted cereal successfully")
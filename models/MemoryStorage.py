@@ -0,0 +1,490 @@
+import bisect
+import threading
+from itertools import chain, islice
+from operator import itemgetter
+from typing import List
+from models.ApiResponse import ApiResponse
+from models.Cereal import Cereal
+from models.ColumnSnapshot import COMPARISONS, DEFAULT_AGGREGATES
+from models.Filter import FILTERABLE_FIELDS, Filter
+from models.Metrics import Metrics
+from models.parser import Parser
+from models.Query import Query, parse_fields
+from models.Storage import Storage
+
+# A stored row is a tuple in this order, like SELECT * on the cereals table
+KEYS = ("id",) + Cereal.COLUMNS
+POSITIONS = {key: position for position, key in enumerate(KEYS)}
+TYPES = tuple(Cereal.FIELDS[column][1] for column in Cereal.COLUMNS)
+
+
+class SortedIndex:
+    """
+    A secondary index on one column: the non-NULL values in sorted order, with the id of each row in a parallel list.
+    Rows with the same value are ordered by id, so a row is found with two bisects and every comparison
+    (eq, lt, gte, prefix, ...) is a range of positions. NULLs are kept apart, like in SQL they match no filter.
+    """
+    def __init__(self):
+        self.values = []
+        self.ids = []
+        self.nulls = set()
+
+    def add(self, value, id: int):
+        if value is None:
+            self.nulls.add(id)
+            return
+
+        low, high = self.equal_range(value)
+        position = bisect.bisect_left(self.ids, id, low, high)
+        self.values.insert(position, value)
+        self.ids.insert(position, id)
+
+    def remove(self, value, id: int):
+        if value is None:
+            self.nulls.discard(id)
+            return
+
+        low, high = self.equal_range(value)
+        position = bisect.bisect_left(self.ids, id, low, high)
+        del self.values[position]
+        del self.ids[position]
+
+    def extend(self, pairs: list):
+        # Adds many (value, id) pairs with one sort instead of an insert per row, for bulk loads
+        self.nulls.update(id for value, id in pairs if value is None)
+        entries = sorted(list(zip(self.values, self.ids)) + [(value, id) for value, id in pairs if value is not None])
+        self.values = [value for value, _ in entries]
+        self.ids = [id for _, id in entries]
+
+    def equal_range(self, value):
+        # (start, stop) positions of the rows with exactly this value
+        return bisect.bisect_left(self.values, value), bisect.bisect_right(self.values, value)
+
+    def ranges(self, f: Filter) -> list:
+        """The (start, stop) position ranges of the rows matching the filter."""
+        value, end = f.value, len(self.values)
+
+        if f.operator == "in":
+            return [self.equal_range(item) for item in sorted(set(value))]
+        if f.operator == "prefix":
+            return [(bisect.bisect_left(self.values, value), bisect.bisect_left(self.values, prefix_end(value)))]
+
+        low, high = self.equal_range(value)
+        return {
+            "eq": [(low, high)],
+            "ne": [(0, low), (high, end)],
+            "lt": [(0, low)],
+            "lte": [(0, high)],
+            "gt": [(high, end)],
+            "gte": [(low, end)],
+        }[f.operator]
+
+    def select(self, ranges: list) -> List[int]:
+        return [id for start, stop in ranges for id in self.ids[start:stop]]
+
+
+class MemoryStorage(Storage):
+    """
+    This class keeps the cereals in process memory instead of a database, for read-mostly deployments where latency
+    matters and for fast test runs. Nothing is persisted: every process starts empty and is filled with seed().
+    Rows are tuples in a dict on id (the hash index), a sorted list of the ids serves the pages in id order
+    and every filterable column has a SortedIndex. A filter query starts from the index range of its most selective
+    filter and checks the other filters on those rows only.
+    One lock serializes the reads and writes, which only take microseconds.
+    It answers like SQLiteClient, including the read cache, stats, similar and batch. search is not supported.
+    """
+    table_name = "cereals"
+
+    def __init__(self, cache_size: int = 1024, cache_ttl: float = 60.0, metrics: Metrics = None):
+        super().__init__(cache_size, cache_ttl, metrics)
+        self._lock = threading.RLock()
+        self._rows = {}  # id -> row tuple in KEYS order
+        self._ids = []  # Sorted ids, for the pages of read_all
+        self._indexes = {column: SortedIndex() for column, _ in FILTERABLE_FIELDS.values()}
+        self._next_id = 1  # Ids are never reused, like AUTOINCREMENT
+
+    def close(self):
+        pass
+
+    # Writes, the callers hold the lock. The public writes hold _write_lock until the listeners ran, see Storage
+
+    def _insert(self, values: tuple) -> tuple:
+        row = (self._next_id,) + normalize(values)
+        self._next_id += 1
+        self._rows[row[0]] = row
+        self._ids.append(row[0])
+
+        for column, index in self._indexes.items():
+            index.add(row[POSITIONS[column]], row[0])
+
+        return row
+
+    def _replace(self, id: int, values: tuple) -> tuple:
+        old, row = self._rows[id], (id,) + normalize(values)
+        self._rows[id] = row
+
+        for column, index in self._indexes.items():
+            position = POSITIONS[column]
+            if old[position] != row[position]:
+                index.remove(old[position], id)
+                index.add(row[position], id)
+
+        return row
+
+    def _remove(self, id: int):
+        row = self._rows.pop(id)
+        del self._ids[bisect.bisect_left(self._ids, id)]
+
+        for column, index in self._indexes.items():
+            index.remove(row[POSITIONS[column]], id)
+
+    def _insert_many(self, rows: list) -> int:
+        rows = [(self._next_id + offset,) + normalize(values) for offset, values in enumerate(rows)]
+        self._next_id += len(rows)
+
+        for row in rows:
+            self._rows[row[0]] = row
+            self._ids.append(row[0])
+
+        for column, index in self._indexes.items():
+            position = POSITIONS[column]
+            index.extend([(row[position], row[0]) for row in rows])
+
+        return len(rows)
+
+    def create(self, cereal: Cereal) -> ApiResponse:
+        with self._write_lock:
+            with self._lock:
+                row = self._insert(cereal.to_row())
+
+            self._invalidate(row[0], "create", row[1:])
+            return ApiResponse("success", "Resource created successfully", 201, {"id": row[0]})
+
+    def update(self, id: int, cereal: Cereal) -> ApiResponse:
+        with self._write_lock:
+            with self._lock:
+                if id not in self._rows:
+                    return ApiResponse("error", "Cereal not found", 404)
+                row = self._replace(id, cereal.to_row())
+
+            self._invalidate(id, "update", row[1:])
+            return ApiResponse("success", "Resource updated successfully", 201)
+
+    def delete(self, id: int) -> ApiResponse:
+        with self._write_lock:
+            with self._lock:
+                if id not in self._rows:
+                    return ApiResponse("error", "Cereal not found", 404)
+                self._remove(id)
+
+            self._invalidate(id, "delete")
+            return ApiResponse("success", "Resource deleted successfully", 200, message="Deleted cereal successfully")
+
+    def insert_data(self, cereals) -> ApiResponse:
+        rows = [cereal.to_row() if isinstance(cereal, Cereal) else cereal for cereal in cereals]
+
+        with self._write_lock:
+            with self._lock:
+                self._insert_many(rows)
+
+            self._invalidate()
+            return ApiResponse("success", "Resource created successfully", 201)
+
+    def seed(self, parser: Parser) -> ApiResponse:
+        """
+        Loads the parser's CSV file as an upsert on (name, mfr), like SQLiteClient.seed.
+        There is no seed metadata, the storage starts empty in every process.
+        """
+        inserted = updated = 0
+
+        with self._write_lock:
+            with self._lock:
+                keys = {row[1:3]: row[0] for row in self._rows.values()}  # (name, mfr) -> id
+                new_rows = []
+
+                for values in parser.read_rows():
+                    key = values[:2]
+                    if key not in keys:
+                        keys[key] = None  # Later rows with the same key don't add another row
+                        new_rows.append(values)
+                    elif keys[key] is not None and self._rows[keys[key]][1:] != normalize(values):
+                        self._replace(keys[key], values)
+                        updated += 1
+
+                inserted = self._insert_many(new_rows)
+
+            if inserted or updated:
+                self._invalidate()
+
+            return ApiResponse("success", "Seeded cereals successfully", 200, {"inserted": inserted, "updated": updated})
+
+    def batch(self, operations: list) -> ApiResponse:
+        """Runs a list of (op, id, cereal) operations at once, the results are the same as SQLiteClient.batch."""
+        results, changes = [], []
+
+        with self._write_lock:
+            with self._lock:
+                for op, id, cereal in operations:
+                    if op == "create":
+                        row = self._insert(cereal.to_row())
+                        results.append({"op": op, "status_code": 201, "id": row[0]})
+                        changes.append((op, row[0], row[1:]))
+                    elif id not in self._rows:
+                        results.append({"op": op, "status_code": 404, "id": id, "message": "Cereal not found"})
+                    elif op == "update":
+                        row = self._replace(id, cereal.to_row())
+                        results.append({"op": op, "status_code": 201, "id": id})
+                        changes.append((op, id, row[1:]))
+                    else:
+                        self._remove(id)
+                        results.append({"op": op, "status_code": 200, "id": id})
+                        changes.append((op, id, None))
+
+            if changes:
+                self._invalidate_many(changes)
+
+            return ApiResponse("success", "Batch executed successfully", 200, results)
+
+    # Reads
+
+    def does_product_exist(self, id: int) -> bool:
+        return id in self._rows
+
+    def read(self, id: int, fields: List[str] = None) -> ApiResponse:
+        columns = parse_fields(fields)
+        key = tuple(columns) if columns else None
+        return self._cached(("read", id, key), lambda: self._read(id, columns))
+
+    def _read(self, id: int, columns: List[str] = None) -> ApiResponse:
+        row = self._rows.get(id)
+        if row is None:
+            return ApiResponse("error", "Cereal not found", 404)
+
+        return found([as_dict(row, columns)], "Fetched cereal successfully")
+
+    def read_all(self, limit: int = None, cursor: str = None, fields: List[str] = None) -> ApiResponse:
+        query = Query(self.table_name, fields=fields, limit=limit, cursor=cursor)
+        key = tuple(query.columns) if query.columns else None
+
+        if limit is None:
+            return self._cached(("read_all", key), lambda: self._read_all(query.columns))
+
+        after_id = query.after[0] if query.after else 0
+        return self._cached(("read_all", key, limit, after_id), lambda: self._read_page(query, after_id))
+
+    def _read_page(self, query: Query, after_id: int) -> ApiResponse:
+        with self._lock:
+            start = bisect.bisect_right(self._ids, after_id)
+            rows = [as_dict(self._rows[id], query.columns) for id in self._ids[start:start + query.limit + 1]]
+
+        return self._page(query, rows, "Fetched cereals successfully")
+
+    def list(self) -> ApiResponse:
+        return self._read_all()
+
+    def _read_all(self, columns: List[str] = None) -> ApiResponse:
+        with self._lock:
+            rows = [as_dict(row, columns) for row in self._rows.values()]
+
+        return found(rows, "Fetched all cereals successfully")
+
+    def filter(self, filters: List[Filter], limit: int = None, cursor: str = None,
+               sort: str = None, fields: List[str] = None) -> ApiResponse:
+        query = Query(self.table_name, filters, sort, fields, limit, cursor)
+        return self._cached(("filter",) + query.key(), lambda: self._filter(query))
+
+    def _filter(self, query: Query) -> ApiResponse:
+        # Like the SELECT of Query, the projection keeps the sort column until the next cursor is built
+        columns = query.columns
+        if columns and query.sort_column and query.sort_column not in columns:
+            columns = columns + [query.sort_column]
+
+        with self._lock:
+            rows = [as_dict(self._rows[id], columns) for id in self._find(query)]
+
+        if not rows:
+            return ApiResponse("error", "No cereals found for filters", 404)
+
+        result = self._page(query, rows, f"Found {min(len(rows), query.limit or len(rows))} cereals for filters")
+        result.data = query.project(result.data)
+        return result
+
+    def _page(self, query: Query, rows: List[dict], message: str) -> ApiResponse:
+        # rows holds one row more than the page when there is a next page
+        if query.limit is not None and len(rows) > query.limit:
+            rows = rows[:query.limit]
+            return found(rows, message, query.next_cursor(rows[-1]))
+
+        return found(rows, message)
+
+    def _find(self, query: Query) -> List[int]:
+        """
+        The ids of the query's rows in its order, one more than the limit to detect a next page.
+        Like a query planner it picks one of two plans: with a selective filter the rows come from its index range
+        and are sorted afterwards, otherwise the rows are walked in the requested order (the ids, or the index of the
+        sort column) and checked against every filter until the page is full.
+        """
+        count = query.limit + 1 if query.limit is not None else None
+        plan = self._plan(query.filters)
+
+        # Walking in order checks about count * rows / matches rows, the index range has `matches` rows to sort
+        if plan is None or (count is not None and count * len(self._rows) < plan[0] * plan[0]):
+            checks = [(POSITIONS[f.column], f) for f in query.filters]
+            ids = (id for id in self._walk(query) if self._check(id, checks))
+            return list(islice(ids, count))
+
+        _, driver, ranges = plan
+        checks = [(POSITIONS[f.column], f) for f in query.filters if f is not driver]
+        ids = [id for id in self._indexes[driver.column].select(ranges) if self._check(id, checks)]
+        return self._ordered(ids, query)[:count]
+
+    def _plan(self, filters: List[Filter]):
+        # (matching rows, filter, index ranges) of the most selective filter, None without filters
+        plans = []
+        for f in filters:
+            ranges = self._indexes[f.column].ranges(f)
+            plans.append((sum(stop - start for start, stop in ranges), f, ranges))
+
+        return min(plans, key=itemgetter(0)) if plans else None
+
+    def _check(self, id: int, checks: list) -> bool:
+        row = self._rows[id]
+        for position, f in checks:
+            if not matches(f, row[position]):
+                return False
+        return True
+
+    def _walk(self, query: Query):
+        """Every id in the order of the query (NULLs first, ties by id, like Query's ORDER BY), after the cursor."""
+        after = query.after
+
+        if query.sort_column is None:
+            ids = self._ids
+            if query.descending:
+                stop = bisect.bisect_left(ids, after[0]) if after else len(ids)
+                return (ids[position] for position in range(stop - 1, -1, -1))
+            return islice(ids, bisect.bisect_right(ids, after[0]) if after else 0, None)
+
+        index = self._indexes[query.sort_column]
+        nulls = sorted(index.nulls)
+
+        if after is None:
+            start, stop = 0, len(index.ids)
+        elif after[0] is None:
+            # The cursor is inside the NULLs
+            nulls = [id for id in nulls if (id < after[1] if query.descending else id > after[1])]
+            start, stop = (0, 0) if query.descending else (0, len(index.ids))
+        else:
+            nulls = [] if not query.descending else nulls
+            low, high = index.equal_range(after[0])
+            start = bisect.bisect_right(index.ids, after[1], low, high)
+            stop = bisect.bisect_left(index.ids, after[1], low, high)
+            start, stop = (0, stop) if query.descending else (start, len(index.ids))
+
+        if query.descending:
+            return chain((index.ids[position] for position in range(stop - 1, start - 1, -1)), reversed(nulls))
+        return chain(nulls, islice(index.ids, start, stop))
+
+    def _ordered(self, ids: List[int], query: Query) -> List[int]:
+        # Orders the ids like the ORDER BY of Query (NULLs first, ties by id) and skips up to the cursor
+        if query.sort_column is None:
+            ids.sort()
+            if query.after is not None:
+                ids = ids[bisect.bisect_right(ids, query.after[0]):] if not query.descending \
+                    else ids[:bisect.bisect_left(ids, query.after[0])]
+            return ids[::-1] if query.descending else ids
+
+        position = POSITIONS[query.sort_column]
+        key = {id: sort_key(self._rows[id][position], id) for id in ids}
+        ids.sort(key=key.get, reverse=query.descending)
+
+        if query.after is not None:
+            after = sort_key(*query.after)
+            ids = [id for id in ids if (key[id] < after if query.descending else key[id] > after)]
+
+        return ids
+
+    def stream(self, filters: List[Filter] = None, batch_size: int = 500):
+        """Returns a generator over every (matching) cereal by id, in lists of at most batch_size dicts."""
+        query = Query(self.table_name, filters)
+
+        with self._lock:
+            rows = [self._rows[id] for id in self._find(query)]
+
+        return (
+            [as_dict(row) for row in rows[start:start + batch_size]] for start in range(0, len(rows), batch_size)
+        )
+
+    def stream_page(self, filters: List[Filter] = None, limit: int = 500, cursor: str = None) -> ApiResponse:
+        return self._filter(Query(self.table_name, filters, limit=limit, cursor=cursor))
+
+    def _select(self, columns) -> List[tuple]:
+        get = itemgetter(0, *(POSITIONS[column] for column in columns))
+        with self._lock:
+            return [get(row) for row in self._rows.values()]
+
+    def stats(self, fields: List[str], group_by: str = None, aggregates=DEFAULT_AGGREGATES,
+              filters: List[Filter] = None, top: int = None) -> ApiResponse:
+        data = self._snapshot().aggregate(fields, group_by, aggregates, filters, top)
+        return ApiResponse("success", "Computed statistics", 200, data,
+                           message=f"Aggregated {sum(group['count'] for group in data['groups'])} cereals")
+
+    def similar(self, id: int, k: int = 10) -> ApiResponse:
+        return self._cached(("similar", id, k), lambda: self._similar(id, k))
+
+    def _similar(self, id: int, k: int) -> ApiResponse:
+        try:
+            neighbours = self._similarity_index().nearest(id, k)
+        except KeyError:
+            return ApiResponse("error", "Cereal not found", 404)
+
+        rows = [{**as_dict(self._rows[neighbour]), "distance": distance}
+                for neighbour, distance in neighbours if neighbour in self._rows]
+        if not rows:
+            return ApiResponse("success", "Found 0 similar cereals", 200, [])
+
+        return found(rows, f"Found {len(rows)} similar cereals")
+
+
+def found(rows: List[dict], message: str, next_cursor: str = None) -> ApiResponse:
+    # The response SQLiteClient gives for a successful SELECT
+    return ApiResponse("success", "Query executed successfully", 200, rows, message=message, next_cursor=next_cursor)
+
+
+def as_dict(row: tuple, columns: List[str] = None) -> dict:
+    # Every column, or only the columns of a projection (see parse_fields)
+    if columns is None:
+        return dict(zip(KEYS, row))
+
+    return {column: row[POSITIONS[column]] for column in columns}
+
+
+def normalize(values: tuple) -> tuple:
+    # Stores the values the way SQLite's column affinity does: ints in FLOAT columns become floats,
+    # whole floats in INT columns become ints
+    return tuple(
+        float(value) if type_ is float and type(value) is int
+        else int(value) if type_ is int and type(value) is float and value.is_integer()
+        else value
+        for type_, value in zip(TYPES, values)
+    )
+
+
+def prefix_end(prefix: str) -> str:
+    # The first string after every string starting with prefix, see Filter.to_sql
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def matches(f: Filter, value) -> bool:
+    if value is None:
+        return False
+    if f.operator == "in":
+        return value in f.value
+    if f.operator == "prefix":
+        return f.value <= value < prefix_end(f.value)
+    return COMPARISONS[f.operator](value, f.value)
+
+
+def sort_key(value, id: int) -> tuple:
+    # NULLs sort before every value, like in SQLite
+    return (0, 0, id) if value is None else (1, value, id)
@@ -0,0 +1,161 @@
+import logging
+import threading
+import time
+from flask import Flask, g, request
+from flask.json.provider import JSONProvider
+
+# Upper bounds (seconds) of the latency histogram buckets
+BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+slow_query_log = logging.getLogger("cereals.slow_query")
+
+
+class Metrics:
+    """
+    This class collects opt-in performance metrics and renders them in the Prometheus text format.
+    - HTTP handler time per method, route and status (install() adds before/after-request hooks)
+    - Query time and row counts per query type, reported by SQLiteClient.execute_query
+    - Connections opened by the ConnectionPool
+    - JSON serialization time (install() wraps the app's JSON provider)
+    Queries slower than slow_query_ms are logged to the "cereals.slow_query" logger.
+    Extra gauges (e.g. the cache counters) can be added with add_collector.
+    """
+    def __init__(self, slow_query_ms: float = 100.0):
+        self.slow_query_ms = slow_query_ms
+        self._lock = threading.Lock()
+        self._counters = {}  # (name, labels) -> value
+        self._histograms = {}  # (name, labels) -> [bucket counts, sum, count]
+        self._help = {}  # name -> (type, help text)
+        self._collectors = []
+
+    def _labels(self, **labels):
+        return tuple(sorted(labels.items()))
+
+    def inc(self, name: str, help: str, value: float = 1, **labels):
+        key = (name, self._labels(**labels))
+        with self._lock:
+            self._help.setdefault(name, ("counter", help))
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, name: str, help: str, seconds: float, **labels):
+        key = (name, self._labels(**labels))
+        with self._lock:
+            self._help.setdefault(name, ("histogram", help))
+            histogram = self._histograms.setdefault(key, [[0] * len(BUCKETS), 0.0, 0])
+
+            for index, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    histogram[0][index] += 1
+
+            histogram[1] += seconds
+            histogram[2] += 1
+
+    def add_collector(self, collector):
+        # collector() returns a list of (name, help, value) gauges, it is called on every render()
+        self._collectors.append(collector)
+
+    def observe_request(self, method: str, route: str, status: int, seconds: float):
+        self.inc("cereal_http_requests_total", "HTTP requests handled", method=method, route=route, status=status)
+        self.observe("cereal_http_request_duration_seconds", "Time spent handling HTTP requests",
+                     seconds, method=method, route=route)
+
+    def observe_query(self, query_type: str, sql: str, seconds: float, rows: int):
+        self.inc("cereal_db_queries_total", "SQL queries executed", type=query_type)
+        self.inc("cereal_db_rows_total", "Rows returned or changed by SQL queries", max(rows, 0), type=query_type)
+        self.observe("cereal_db_query_duration_seconds", "Time spent executing SQL queries", seconds, type=query_type)
+
+        if seconds * 1000 >= self.slow_query_ms:
+            self.inc("cereal_db_slow_queries_total", "SQL queries slower than the slow query threshold", type=query_type)
+            slow_query_log.warning("Slow query (%.1f ms, %d rows): %s", seconds * 1000, rows, " ".join(sql.split()))
+
+    def count_connection_open(self):
+        self.inc("cereal_db_connections_opened_total", "SQLite connections opened")
+
+    def observe_serialization(self, seconds: float):
+        self.observe("cereal_json_serialization_seconds", "Time spent serializing JSON responses", seconds)
+
+    def install(self, app: Flask):
+        """Adds the request timing hooks and the serialization timer to a Flask app."""
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+        app.json = TimedJSONProvider(app, app.json, self)
+
+    def _before_request(self):
+        g.metrics_start = time.perf_counter()
+
+    def _after_request(self, response):
+        start = g.get("metrics_start")
+
+        if start is not None:
+            route = request.url_rule.rule if request.url_rule else "unmatched"
+            self.observe_request(request.method, route, response.status_code, time.perf_counter() - start)
+
+        return response
+
+    def render(self) -> str:
+        lines = []
+
+        with self._lock:
+            counters = dict(self._counters)
+            histograms = {key: (list(value[0]), value[1], value[2]) for key, value in self._histograms.items()}
+            help = dict(self._help)
+
+        for name in sorted(help):
+            type_, text = help[name]
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {type_}")
+
+            if type_ == "counter":
+                for (counter, labels), value in sorted(counters.items()):
+                    if counter == name:
+                        lines.append(f"{name}{format_labels(labels)} {value}")
+                continue
+
+            for (histogram, labels), (buckets, total, count) in sorted(histograms.items()):
+                if histogram != name:
+                    continue
+                for bound, bucket in zip(BUCKETS, buckets):
+                    lines.append(f"{name}_bucket{format_labels(labels + (('le', bound),))} {bucket}")
+                lines.append(f"{name}_bucket{format_labels(labels + (('le', '+Inf'),))} {count}")
+                lines.append(f"{name}_sum{format_labels(labels)} {total}")
+                lines.append(f"{name}_count{format_labels(labels)} {count}")
+
+        for collector in self._collectors:
+            for name, text, value in collector():
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} gauge")
+                lines.append(f"{name} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+class TimedJSONProvider(JSONProvider):
+    """Wraps the app's JSON provider and reports how long dumps() and response() take to Metrics."""
+    def __init__(self, app: Flask, provider: JSONProvider, metrics: Metrics):
+        super().__init__(app)
+        self.provider = provider
+        self.metrics = metrics
+
+    def dumps(self, obj, **kwargs):
+        start = time.perf_counter()
+        result = self.provider.dumps(obj, **kwargs)
+        self.metrics.observe_serialization(time.perf_counter() - start)
+        return result
+
+    def loads(self, s, **kwargs):
+        return self.provider.loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        # jsonify goes through response(), the wrapped provider may encode without calling its dumps()
+        start = time.perf_counter()
+        result = self.provider.response(*args, **kwargs)
+        self.metrics.observe_serialization(time.perf_counter() - start)
+        return result
+
+
+def format_labels(labels):
+    if not labels:
+        return ""
+
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
@@ -0,0 +1,178 @@
+from typing import List
+from models.Filter import FILTERABLE_FIELDS, Filter
+from utils import decode_cursor, encode_cursor
+
+
+def parse_fields(fields: List[str]) -> List[str]:
+    """
+    The columns to select for ?fields=, validated against the schema: 'id' first, then every field once.
+    None (every column) without fields, raises ValueError for an unknown field.
+    """
+    if not fields:
+        return None
+
+    columns = ["id"]
+    for field in fields:
+        if field == "id":
+            continue
+        if field not in FILTERABLE_FIELDS:
+            raise ValueError(f"Unknown field '{field}'")
+        column = FILTERABLE_FIELDS[field][0]
+        if column not in columns:
+            columns.append(column)
+
+    return columns
+
+
+class Query:
+    """
+    This class builds the SELECT for a filtered, sorted, projected and paginated list of cereals.
+    - filters: list of Filter objects, combined with AND
+    - sort: a filterable field, prefixed with '-' for descending order. Ties are broken by id.
+    - fields: the fields to return, 'id' is always included. None returns every column.
+    - limit/cursor: keyset pagination. The cursor holds the sort value and id of the last row of the previous page,
+      so the next page starts with an index seek instead of an OFFSET scan.
+    """
+    def __init__(self, table: str, filters: List[Filter] = None, sort: str = None, fields: List[str] = None,
+                 limit: int = None, cursor: str = None):
+        self.table = table
+        self.filters = filters or []
+        self.limit = limit
+        self.sort_column, self.descending = self._parse_sort(sort)
+        self.columns = parse_fields(fields)
+        self.after = self._parse_cursor(cursor) if limit is not None else None
+
+    def _parse_sort(self, sort):
+        if not sort:
+            return None, False
+
+        descending = sort.startswith("-")
+        field = sort.lstrip("-")
+
+        if field == "id":
+            return None, descending
+
+        if field not in FILTERABLE_FIELDS:
+            raise ValueError(f"Cannot sort by unknown field '{field}'")
+
+        return FILTERABLE_FIELDS[field][0], descending
+
+    def _parse_cursor(self, cursor):
+        if cursor is None:
+            return None
+
+        values = decode_cursor(cursor)
+        expected = 2 if self.sort_column else 1
+
+        if len(values) != expected or not isinstance(values[-1], int):
+            raise ValueError("Invalid cursor")
+
+        return tuple(values)
+
+    def key(self):
+        # The same filters in any order share one cache entry
+        filters = tuple(sorted((f.key() for f in self.filters), key=repr))
+        columns = tuple(self.columns) if self.columns else None
+        return (filters, self.sort_column, self.descending, columns, self.limit, self.after)
+
+    def _select_columns(self):
+        if self.columns is None:
+            return "*"
+
+        # The sort column is needed for the next cursor, it is removed from the rows again in project()
+        columns = list(self.columns)
+        if self.sort_column and self.sort_column not in columns:
+            columns.append(self.sort_column)
+
+        return ", ".join(columns)
+
+    @property
+    def walks_ids(self) -> bool:
+        """
+        Whether this is a page in id order with a single filter whose index isn't in id order (a range, prefix
+        or in filter), so SQLite walks the table in id order and checks the filter until the page is full.
+        With several filters the walk is kept, counting their matches could take longer than the page itself.
+        """
+        return (self.limit is not None and not self.sort_column and len(self.filters) == 1
+                and self.filters[0].operator != "eq")
+
+    def _filter_sql(self):
+        conditions = []
+        params = []
+
+        for f in self.filters:
+            condition, values = f.to_sql()
+            conditions.append(condition)
+            params.extend(values)
+
+        return conditions, params
+
+    def count_sql(self, bound: int):
+        """Returns the SQL and parameters counting the rows that match the filters, but at most bound of them."""
+        conditions, params = self._filter_sql()
+        where = " WHERE " + " AND ".join(conditions) if conditions else ""
+        return f"SELECT count(*) AS matches FROM (SELECT 1 FROM {self.table}{where} LIMIT ?)", tuple(params) + (bound,)
+
+    def to_sql(self, by_index: bool = False):
+        """
+        Returns the SQL and its parameters. With a limit one extra row is fetched to detect a next page.
+        by_index writes the id as +id, which keeps SQLite from walking the table in id order,
+        so it reads the rows from a filter's index and sorts them instead (see SQLiteClient._by_index).
+        """
+        conditions, params = self._filter_sql()
+        comparison = "<" if self.descending else ">"
+        id_column = "+id" if by_index and not self.sort_column else "id"
+
+        if self.after is not None:
+            if self.sort_column:
+                condition, values = self._after_sort_value(comparison)
+                conditions.append(condition)
+                params.extend(values)
+            else:
+                conditions.append(f"{id_column} {comparison} ?")
+                params.extend(self.after)
+
+        sql = f"SELECT {self._select_columns()} FROM {self.table}"
+
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+
+        direction = "DESC" if self.descending else "ASC"
+        if self.sort_column:
+            sql += f" ORDER BY {self.sort_column} {direction}, id {direction}"
+        else:
+            sql += f" ORDER BY {id_column} {direction}"
+
+        if self.limit is not None:
+            sql += " LIMIT ?"
+            params.append(self.limit + 1)
+
+        return sql, tuple(params)
+
+    def _after_sort_value(self, comparison):
+        # NULLs sort first in ascending and last in descending order, and a row comparison with NULL is never true,
+        # so the rows with a NULL sort value are handled on their own
+        column = self.sort_column
+        value, id = self.after
+
+        if value is None:
+            if self.descending:
+                return f"({column} IS NULL AND id < ?)", [id]
+            return f"(({column} IS NULL AND id > ?) OR {column} IS NOT NULL)", [id]
+
+        if self.descending:
+            return f"(({column}, id) < (?, ?) OR {column} IS NULL)", [value, id]
+        return f"({column}, id) > (?, ?)", [value, id]
+
+    def next_cursor(self, row: dict) -> str:
+        if self.sort_column:
+            return encode_cursor([row[self.sort_column], row["id"]])
+
+        return encode_cursor([row["id"]])
+
+    def project(self, rows: List[dict]) -> List[dict]:
+        # Drops the sort column again if it was only selected to build the cursor
+        if self.columns is None or not self.sort_column or self.sort_column in self.columns:
+            return rows
+
+        return [{column: row[column] for column in self.columns} for row in rows]
@@ -0,0 +1,81 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class QueryCache:
+    """
+    This class is a thread-safe LRU cache with a time-to-live, used by SQLiteClient to cache read results.
+    Entries are evicted when they are older than ttl seconds or when the cache grows past max_size.
+    Every invalidation bumps a generation counter, put() is ignored if the generation changed
+    while the value was being loaded, so a read that raced with a write can't store a stale result.
+    Hit, miss, eviction and invalidation counters are available through stats().
+    """
+    def __init__(self, max_size: int = 1024, ttl: float = 60.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries = OrderedDict()  # key -> (expires_at, value), oldest first
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def get(self, key):
+        """Returns a (hit, value) tuple."""
+        with self._lock:
+            entry = self._entries.get(key)
+
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return True, value
+
+                del self._entries[key]
+                self.evictions += 1
+
+            self.misses += 1
+            return False, None
+
+    def put(self, key, value, generation: int):
+        with self._lock:
+            if generation != self.generation:
+                return
+
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, predicate):
+        # Removes every entry whose key matches the predicate
+        with self._lock:
+            self.generation += 1
+            for key in [key for key in self._entries if predicate(key)]:
+                del self._entries[key]
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self.invalidations += len(self._entries)
+            self._entries.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "invalidations": self.invalidations,
+            }
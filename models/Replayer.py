@@ -0,0 +1,137 @@
+import json
+import re
+import threading
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor
+
+from models.Driver import password, print_benchmark, summarize
+from models.TrafficRecorder import REDACTED, REDACTED_VALID
+
+# Fields of the ApiResponse envelope that are compared when diffing a replayed response with the recorded one
+COMPARED_FIELDS = ("status", "status_code", "data")
+
+
+class Replayer:
+    """
+    This class replays a traffic capture (see TrafficRecorder) against a running API.
+    Requests are sent at their original pacing divided by speed (speed=2 is twice as fast), speed=0 sends them
+    as fast as the workers allow. Requests that overlapped in the capture also overlap in the replay.
+    replay() returns the latency summary per endpoint (same format as Driver.benchmark) plus the status codes
+    and responses that differ from the capture.
+    """
+    def __init__(self, url: str = "127.0.0.1:5000", speed: float = 1.0, workers: int = 16, max_diffs: int = 20):
+        self.url = url
+        self.speed = speed
+        self.workers = workers
+        self.max_diffs = max_diffs
+        self._local = threading.local()
+
+    def load(self, path: str):
+        with open(path, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+
+        # Records are written when a response is finished, so a slow request comes after the ones that started later
+        records.sort(key=lambda r: r["ts"])
+        return records
+
+    def replay(self, path: str) -> dict:
+        records = self.load(path)
+        if not records:
+            return {"summary": summarize([], 0.0, self.workers),
+                    "status_mismatches": 0, "response_mismatches": 0, "diffs": []}
+
+        samples = []
+        diffs = []
+        mismatches = {"status": 0, "response": 0}
+        lock = threading.Lock()
+
+        def send(record):
+            start = time.perf_counter()
+            try:
+                response = self._session().request(
+                    record["method"], self._endpoint(record), json=self._body(record),
+                    headers={"Content-Type": "application/json", "Accept": "application/json"})
+                status_code = response.status_code
+                body = response.json() if "json" in response.headers.get("Content-Type", "") else None
+            except Exception:
+                status_code, body = None, None
+            latency = time.perf_counter() - start
+
+            diff = self._diff(record, status_code, body)
+            with lock:
+                samples.append((f"{record['method']} {route(record['path'])}", status_code, latency))
+                if diff:
+                    mismatches[diff["kind"]] += 1
+                    if len(diffs) < self.max_diffs:
+                        diffs.append(diff)
+
+        first_ts = records[0]["ts"]
+        start = time.perf_counter()
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            for record in records:
+                if self.speed:
+                    delay = (record["ts"] - first_ts) / self.speed - (time.perf_counter() - start)
+                    if delay > 0:
+                        time.sleep(delay)
+                executor.submit(send, record)
+
+        elapsed = time.perf_counter() - start
+
+        return {
+            "summary": summarize(samples, elapsed, self.workers),
+            "status_mismatches": mismatches["status"],
+            "response_mismatches": mismatches["response"],
+            "diffs": diffs,
+        }
+
+    def _session(self):
+        # One keep-alive session per worker thread
+        if not hasattr(self._local, "session"):
+            self._local.session = requests.Session()
+        return self._local.session
+
+    def _endpoint(self, record):
+        endpoint = f"http://{self.url}{record['path']}"
+        if record.get("query"):
+            endpoint += f"?{record['query']}"
+        return endpoint
+
+    def _body(self, record):
+        # Only passwords that were valid in the capture are replaced by the real one,
+        # an invalid one is sent as the marker, which is just as invalid
+        body = record.get("body")
+        if isinstance(body, dict) and body.get("password") in (REDACTED, REDACTED_VALID):
+            body = {**body, "password": password}
+        return body
+
+    def _diff(self, record, status_code, body):
+        path = f"{record['method']} {record['path']}"
+
+        if status_code != record.get("status"):
+            return {"kind": "status", "request": path, "expected": record.get("status"), "actual": status_code}
+
+        expected = record.get("response")
+        if not isinstance(expected, dict) or not isinstance(body, dict):
+            return None
+
+        for field in COMPARED_FIELDS:
+            if expected.get(field) != body.get(field):
+                return {"kind": "response", "request": path, "field": field,
+                        "expected": expected.get(field), "actual": body.get(field)}
+
+        return None
+
+
+def route(path):
+    # /cereals/12 -> /cereals/<id>, so latencies are grouped per endpoint
+    return re.sub(r"/\d+(?=/|$)", "/<id>", path)
+
+
+def print_replay(result):
+    print_benchmark(result["summary"])
+    print(f"Status code mismatches: {result['status_mismatches']}, response mismatches: {result['response_mismatches']}")
+
+    for diff in result["diffs"]:
+        print(f"  {diff}")
@@ -0,0 +1,35 @@
+import uuid
+from models.QueryCache import QueryCache
+
+
+class ResponseCache:
+    """
+    This class keeps the serialized bodies of GET responses, tagged with the table version they were built at.
+    A body is only served while SQLiteClient.version is unchanged, so a write makes every entry stale at once
+    without having to find the entries it affects.
+    The ETag of a response is derived from the version: a client that sends it back in If-None-Match
+    gets a 304 without the database or the serializer being touched.
+    The random epoch keeps an ETag from a previous run from matching after a restart, when the version starts over.
+    The version only counts writes made by this process, so the cache must not be used with several processes.
+    """
+    def __init__(self, max_size: int = 1024, ttl: float = 60.0):
+        self.cache = QueryCache(max_size, ttl)
+        self.epoch = uuid.uuid4().hex[:8]
+
+    def etag(self, version: int) -> str:
+        # Unquoted, werkzeug adds the quotes when it sets the header
+        return f"{self.epoch}-{version}"
+
+    def get(self, key, version: int):
+        """Returns the cached body for key if it was built at version, otherwise None."""
+        hit, entry = self.cache.get(key)
+        if hit and entry[0] == version:
+            return entry[1]
+
+        return None
+
+    def put(self, key, version: int, body: bytes):
+        self.cache.put(key, (version, body), self.cache.generation)
+
+    def stats(self) -> dict:
+        return self.cache.stats()
@@ -1,155 +1,635 @@
+import math
 import os
+import time
+from itertools import groupby
 from flask import jsonify
 from typing import List
 from models.ApiResponse import ApiResponse
 from models.Cereal import Cereal
-from models.Filter import Filter
+from models.ColumnSnapshot import DEFAULT_AGGREGATES
+from models.ConnectionPool import ConnectionPool
+from models.Filter import FILTERABLE_FIELDS, Filter
+from models.GroupCommitWriter import GroupCommitWriter
+from models.Metrics import Metrics
+from models.parser import Parser
+from models.Query import Query, parse_fields
+from models.Statement import Statement, get_statement
+from models.Storage import Storage
 from dotenv import load_dotenv
 import sqlite3
-from utils import get_assignments_and_values, get_columns_and_placeholders, is_successful
+from utils import DEFAULT_PAGE_SIZE, as_dicts, decode_cursor, encode_cursor, file_sha256, get_assignments, get_columns_and_placeholders, is_successful
 
 load_dotenv()
 
+# Column type for each type in the Cereal schema
+SQL_TYPES = {str: "VARCHAR(255)", int: "INT", float: "FLOAT"}
 
-class SQLiteClient:
+# Filters whose _by_index decision is kept, the decisions are dropped when there are more
+MAX_PLANS = 1024
+
+
+class SQLiteClient(Storage):
     """
-    This class is responsible for handling all database operations.
+    This class is responsible for handling all database operations, it is the SQLite implementation of Storage.
     It initializes the database and provides methods for CRUD operations on the 'cereals' table.
     It also provides methods for filtering and listing cereals.
     It uses the method execute_query to execute SQL queries on the database.
         - execute_query returns an ApiResponse object with the appropriate response and status code.
     Execute_db_operation is a wrapper around execute_query that ensures the appropriate success message is returned.
     Every method returns an ApiResponse object.
+    Connections are borrowed from a ConnectionPool instead of being opened for every query,
+    call close() on shutdown to close the pooled connections.
+    Writes go through a single writer connection (pool), so they queue in the pool instead of retrying on SQLITE_BUSY,
+    every query that only reads (read, read_all, list, filter, does_product_exist, search, ...) borrows one of
+    pool_size read-only connections (read_pool) instead. In WAL mode those keep reading while a write is in progress.
+    The SQL for the CRUD operations is built once in _prepare_statements, so a request only binds parameters.
+    read, read_all and filter are served from the read-through QueryCache of Storage, which the writes invalidate,
+    pass cache_size=0 to disable it. version counts the writes made through this client.
+    If a Metrics object is given, every execute_query call reports its duration and row count to it.
+    read_all and filter take an optional limit and cursor for keyset pagination on id,
+    so every page is a bounded index range scan no matter how large the table is.
+    Every filterable column has a secondary index, created in _initialize_db.
+    With group_commit_ms, create, update and delete are queued to a GroupCommitWriter which commits
+    the writes of many callers together, at most that many milliseconds after the first one arrived.
+    Pass multi_process when several processes use the database (gunicorn workers): stats and similar then check
+    PRAGMA data_version (see _data_version) before they reuse the rows they keep in memory.
     """
-    def __init__(self):
+    def __init__(self, database: str = "cereals.db", pool_size: int = 5, pragmas: dict = None,
+                 cache_size: int = 1024, cache_ttl: float = 60.0, metrics: Metrics = None,
+                 group_commit_ms: float = None, multi_process: bool = False):
+        super().__init__(cache_size, cache_ttl, metrics, multi_process)
         self.table_name = "cereals"
+        self.fts_table = "cereals_fts"  # Full-text index on name, see _initialize_search
+        self.pool = ConnectionPool(database, size=1, pragmas=pragmas, metrics=metrics)
+        self.read_pool = ConnectionPool(database, size=pool_size, pragmas=pragmas, metrics=metrics, read_only=True)
+        self.statements = self._prepare_statements()
         self._initialize_db()
+        # PRAGMA data_version is per connection, so it is always read on this one, see _data_version
+        self.watch_pool = ConnectionPool(database, size=1, pragmas=pragmas, read_only=True) if multi_process else None
+        self.writer = GroupCommitWriter(self, group_commit_ms / 1000) if group_commit_ms else None
+        self._plans = {}  # (filter key, limit) -> _by_index decision, for the table version in _plans_version
+        self._plans_version = None
+
+    @property
+    def concurrency(self) -> int:
+        return self.read_pool.size + self.pool.size
 
     def connect(self):
-        connection = sqlite3.connect("cereals.db")
-        connection.row_factory = sqlite3.Row
-        return connection
+        # Borrows a pooled connection, the transaction is committed and the connection handed back when the with-block exits
+        return self.pool.connection()
+
+    def connect_reader(self):
+        # Borrows a read-only connection, for queries that don't write
+        return self.read_pool.connection()
+
+    def close(self):
+        if self.writer:
+            self.writer.close()  # Commits the queued writes first
+        self.read_pool.close()
+        self.pool.close()
+        if self.watch_pool:
+            self.watch_pool.close()
+
+    def _prepare_statements(self) -> dict:
+        columns, placeholders = get_columns_and_placeholders(Cereal)
+        assignments = get_assignments(Cereal)
+        table = self.table_name
+        seed_columns = Cereal.COLUMNS[2:]  # Every column except the natural key (name, mfr)
+        seed_assignments = ", ".join(f"{column} = ?" for column in seed_columns)
+        seed_unchanged = " AND ".join(f"{column} IS ?" for column in seed_columns)
+
+        return {
+            "create": Statement(f"INSERT INTO {table} ({columns}) VALUES ({placeholders})"),
+            # Make sure to use INSERT OR IGNORE to avoid inserting duplicate data
+            "insert_data": Statement(f"INSERT OR IGNORE INTO {table} ({columns}) VALUES ({placeholders})"),
+            "read_all": Statement(f"SELECT * FROM {table} ORDER BY id"),
+            "read_page": Statement(f"SELECT * FROM {table} WHERE id > ? ORDER BY id LIMIT ?"),
+            "read": Statement(f"SELECT * FROM {table} WHERE id = ?"),
+            "exists": Statement(f"SELECT 1 FROM {table} WHERE id = ? LIMIT 1"),
+            "update": Statement(f"UPDATE {table} SET {assignments} WHERE id = ?"),
+            "delete": Statement(f"DELETE FROM {table} WHERE id = ?"),
+            # Seeding upserts on the natural key (name, mfr): the UPDATE only touches rows whose values changed,
+            # the INSERT only adds rows whose key isn't in the table yet. Both use the index on name.
+            "seed_update": Statement(
+                f"UPDATE {table} SET {seed_assignments} WHERE name = ? AND mfr = ? AND NOT ({seed_unchanged})"),
+            "seed_insert": Statement(
+                f"INSERT INTO {table} ({columns}) SELECT {placeholders} "
+                f"WHERE NOT EXISTS (SELECT 1 FROM {table} WHERE name = ? AND mfr = ?)"),
+        }
 
     def _initialize_db(self):
+        columns = ",\n".join(f"            {column} {SQL_TYPES[type_]}" for column, (_, type_, _) in Cereal.FIELDS.items())
         query = f"""
         CREATE TABLE IF NOT EXISTS {self.table_name} (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name VARCHAR(255),
-            mfr VARCHAR(255),
-            type_ VARCHAR(255),
-            calories INT,
-            protein FLOAT,
-            fat FLOAT,
-            sodium FLOAT,
-            fiber FLOAT,
-            carbo FLOAT,
-            sugars FLOAT,
-            potass FLOAT,
-            vitamins FLOAT,
-            shelf INT,
-            weight FLOAT,
-            cups FLOAT,
-            rating FLOAT
+{columns}
         );
         """
         result = self.execute_query(query)
 
+        # Secondary indexes so filters and sorting on any filterable column can seek instead of scanning the table
+        for column, _ in FILTERABLE_FIELDS.values():
+            self.execute_query(
+                f"CREATE INDEX IF NOT EXISTS idx_{self.table_name}_{column} ON {self.table_name} ({column})")
+
+        self._initialize_search()
+
+        # Remembers which version of a seed file was loaded, see seed()
+        self.execute_query("""
+        CREATE TABLE IF NOT EXISTS seed_metadata (
+            source TEXT PRIMARY KEY,
+            sha256 TEXT,
+            size INTEGER,
+            mtime_ns INTEGER
+        );
+        """)
+
         if result:
             print("Database initialized successfully")
 
-    def create(self, cereal: Cereal) -> ApiResponse:        
-        data = [
-            cereal.name, cereal.mfr, cereal.type_, cereal.calories, cereal.protein, cereal.fat,
-            cereal.sodium, cereal.fiber, cereal.carbo, cereal.sugars, cereal.potass,
-            cereal.vitamins, cereal.shelf, cereal.weight, cereal.cups, cereal.rating
-        ]
-        columns, placeholders = get_columns_and_placeholders(cereal)
-        query = f"INSERT INTO cereals ({columns}) VALUES ({placeholders})"
-        result = self.execute_db_operation(
-            query, data, "Created cereal successfully")
+    def _initialize_search(self):
+        """
+        Creates the FTS5 index on name used by search(). It is an external-content table: it stores only the index
+        and reads the names from the cereals table, the triggers keep it in sync with every insert, update and delete.
+        The prefix option adds indexes for 2 and 3 character prefixes, so prefix queries don't scan the term list.
+        An index created for a table that already has rows is filled once with 'rebuild'.
+        """
+        table, fts = self.table_name, self.fts_table
+
+        with self.connect() as connection:
+            exists = connection.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (fts,)).fetchone()
+
+            connection.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                f"name, content='{table}', content_rowid='id', tokenize='unicode61 remove_diacritics 2', prefix='2 3')")
+            connection.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {fts}_insert AFTER INSERT ON {table} BEGIN
+                    INSERT INTO {fts} (rowid, name) VALUES (new.id, new.name);
+                END""")
+            connection.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {fts}_delete AFTER DELETE ON {table} BEGIN
+                    INSERT INTO {fts} ({fts}, rowid, name) VALUES ('delete', old.id, old.name);
+                END""")
+            connection.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS {fts}_update AFTER UPDATE OF name ON {table} BEGIN
+                    INSERT INTO {fts} ({fts}, rowid, name) VALUES ('delete', old.id, old.name);
+                    INSERT INTO {fts} (rowid, name) VALUES (new.id, new.name);
+                END""")
+
+            if not exists:
+                connection.execute(f"INSERT INTO {fts} ({fts}) VALUES ('rebuild')")
+
+    def create(self, cereal: Cereal) -> ApiResponse:
+        if self.writer:
+            return self.writer.submit("create", None, cereal)
+
+        with self._write_lock:
+            result = self.execute_db_operation(
+                self.statements["create"], cereal.to_row(), "Created cereal successfully")
+
+            if result.status_code == 201:
+                self._invalidate(result.data["id"], "create", cereal.to_row())
 
         return result
 
-    def read_all(self) -> ApiResponse:
-        query = "SELECT * FROM cereals"
-        result = self.execute_db_operation(
-            query, None, "Fetched all cereals successfully")
+    def read_all(self, limit: int = None, cursor: str = None, fields: List[str] = None) -> ApiResponse:
+        """
+        Every cereal by id, or a page of limit cereals after the cursor.
+        fields selects the columns (see parse_fields), only those are read from the database.
+        """
+        columns = parse_fields(fields)
+        key = tuple(columns) if columns else None
+
+        if limit is None:
+            return self._cached(("read_all", key), lambda: self.execute_db_operation(
+                self._projected("read_all", columns), None, "Fetched all cereals successfully"))
+
+        after_id = self._cursor_id(cursor)
+        return self._cached(("read_all", key, limit, after_id), lambda: self._read_page(
+            self._projected("read_page", columns), (after_id,), limit, "Fetched cereals successfully"))
+
+    def _projected(self, name: str, columns: List[str]):
+        # The prepared SELECT * statement, or the same SQL with only the columns, cached by get_statement
+        statement = self.statements[name]
+        if not columns:
+            return statement
+
+        return statement.sql.replace("SELECT *", f"SELECT {', '.join(columns)}", 1)
+
+    def _cursor_id(self, cursor: str) -> int:
+        # Ids are assigned from 1, so 0 starts at the first row
+        if cursor is None:
+            return 0
+
+        values = decode_cursor(cursor)
+        if len(values) != 1 or not isinstance(values[0], int):
+            raise ValueError("Invalid cursor")
+
+        return values[0]
+
+    def _read_page(self, query, params: tuple, limit: int, success_message: str) -> ApiResponse:
+        """
+        Runs a keyset query ending in 'id > ? ORDER BY id LIMIT ?'.
+        One extra row is fetched to know whether there is a next page, without a COUNT(*).
+        """
+        result = self.execute_db_operation(query, params + (limit + 1,), success_message)
+
+        if result.status_code == 200 and len(result.data) > limit:
+            result.data = result.data[:limit]
+            result.next_cursor = encode_cursor([result.data[-1]["id"]])
+
         return result
 
-    def read(self, id: int) -> ApiResponse:
-        query = "SELECT * FROM cereals WHERE id = ?"
+    def read(self, id: int, fields: List[str] = None) -> ApiResponse:
+        columns = parse_fields(fields)
+        key = tuple(columns) if columns else None
+        return self._cached(("read", id, key), lambda: self._read(id, columns))
+
+    def _read(self, id: int, columns: List[str] = None) -> ApiResponse:
         result = self.execute_db_operation(
-            query, (id,), "Fetched cereal successfully")
+            self._projected("read", columns), (id,), "Fetched cereal successfully")
+
+        if result.status_code == 200 and not result.data:
+            return ApiResponse("error", "Cereal not found", 404)
+
         return result
 
     def update(self, id: int, cereal: Cereal) -> ApiResponse:
-        assignments, values = get_assignments_and_values(cereal)
-        query = f"UPDATE cereals SET {assignments} WHERE id = ?"
-        data = values + (id,)
-        result = self.execute_db_operation(
-            query, data, "Updated cereal successfully")
+        if self.writer:
+            return self.writer.submit("update", id, cereal)
+
+        data = cereal.to_row() + (id,)
+        with self._write_lock:
+            result = self.execute_db_operation(
+                self.statements["update"], data, "Updated cereal successfully")
+
+            if result.status_code == 201:
+                self._invalidate(id, "update", cereal.to_row())
+
+        # The UPDATE only touches an existing row, so a rowcount of 0 (404) means the cereal doesn't exist
+        if result.status_code == 404:
+            return ApiResponse("error", "Cereal not found", 404)
+
         return result
 
     def delete(self, id: int) -> ApiResponse:
-        cereal = self.read(id).data
-        
-        if not cereal:
+        if self.writer:
+            return self.writer.submit("delete", id)
+
+        with self._write_lock:
+            result = self.execute_db_operation(
+                self.statements["delete"], (id,), "Deleted cereal successfully")
+
+            if result.status_code == 200:
+                self._invalidate(id, "delete")
+
+        if result.status_code == 404:
             return ApiResponse("error", "Cereal not found", 404)
-        
-        query = "DELETE FROM cereals WHERE id = ?"
-        data = (id,)
-        result = self.execute_db_operation(
-            query, data, "Deleted cereal successfully")
 
         return result
 
     def list(self) -> ApiResponse:
-        query = "SELECT * FROM cereals"
         result = self.execute_db_operation(
-            query, None, "Fetched all cereals successfully")
+            self.statements["read_all"], None, "Fetched all cereals successfully")
 
         return result
 
-    def filter(self, filters: List[Filter]) -> ApiResponse:
-        conditions = " AND ".join(f"{f.field} = ?" for f in filters)
-        values = [f.value for f in filters]
-        query = f"SELECT * FROM cereals WHERE {conditions}"
-        result = self.execute_db_operation(query, tuple(
-            values), f"Filtered cereals successfully")
+    def filter(self, filters: List[Filter], limit: int = None, cursor: str = None,
+               sort: str = None, fields: List[str] = None) -> ApiResponse:
+        """
+        Returns the cereals matching every filter, see Query for the operators, sorting, projection and pagination.
+        Raises ValueError for an invalid sort, field or cursor.
+        """
+        query = Query(self.table_name, filters, sort, fields, limit, cursor)
+        return self._cached(("filter",) + query.key(), lambda: self._filter(query))
+
+    def _filter(self, query: Query) -> ApiResponse:
+        sql, params = query.to_sql(self._by_index(query))
+        result = self.execute_db_operation(sql, params, "Filtered cereals successfully")
+
+        if query.limit is not None and result.data and len(result.data) > query.limit:
+            result.data = result.data[:query.limit]
+            result.next_cursor = query.next_cursor(result.data[-1])
 
         if result.data:
+            result.data = query.project(result.data)
             result.message = f"Found {len(result.data)} cereals for filters"
             return result
 
         else:
             return ApiResponse("error", f"No cereals found for filters", 404)
 
+    def _by_index(self, query: Query) -> bool:
+        """
+        Whether a page in id order should read the rows from a filter's index and sort them, instead of walking
+        the table in id order until the page is full. SQLite has no statistics on the values to tell (STAT4),
+        it guesses that a range keeps a quarter of the rows and always walks, which scans the whole table
+        for a selective filter. Like MemoryStorage._find: walking checks about page * rows / matches rows,
+        the index reads the matches, so the index wins below sqrt(page * rows) matches, counted up to that bound
+        on the filter's index. Only single-filter queries are counted (see Query.walks_ids), and the decision is
+        kept until the next write, so a filter is counted once per table version.
+        """
+        if not query.walks_ids:
+            return False
+
+        key = (query.filters[0].key(), query.limit)
+        if self._plans_version != self.version:
+            self._plans, self._plans_version = {}, self.version
+        elif key in self._plans:
+            return self._plans[key]
+
+        # Through execute_query, so the Metrics see these queries like any other
+        result = self.execute_query(f"SELECT max(id) AS last_id FROM {self.table_name}")
+        if result.status_code != 200:
+            return False  # The query itself reports the error
+
+        bound = math.isqrt((query.limit + 1) * (result.data[0]["last_id"] or 0)) + 1
+        sql, params = query.count_sql(bound)
+        result = self.execute_query(sql, params)
+        if result.status_code != 200:
+            return False
+
+        if len(self._plans) >= MAX_PLANS:
+            self._plans = {}
+        self._plans[key] = result.data[0]["matches"] < bound
+        return self._plans[key]
+
+    def search(self, match: str, filters: List[Filter] = None, limit: int = DEFAULT_PAGE_SIZE) -> ApiResponse:
+        """
+        Returns the cereals whose name matches an FTS5 match expression (see utils.search_query), best match first.
+        The ranking is FTS5's bm25, ties are ordered by id. Filters narrow the matches down like in filter().
+        """
+        filters = filters or []
+        key = ("search", match, tuple(sorted((f.key() for f in filters), key=repr)), limit)
+        return self._cached(key, lambda: self._search(match, filters, limit))
+
+    def _search(self, match: str, filters: List[Filter], limit: int) -> ApiResponse:
+        conditions = []
+        params = [match]
+
+        for f in filters:
+            condition, values = f.to_sql()
+            conditions.append(condition)
+            params.extend(values)
+
+        # The match runs on the index alone, the matching rows are then looked up by id
+        sql = (f"SELECT {self.table_name}.* FROM {self.table_name} "
+               f"JOIN (SELECT rowid, rank FROM {self.fts_table} WHERE {self.fts_table} MATCH ?) AS matches "
+               f"ON {self.table_name}.id = matches.rowid")
+        if conditions:
+            sql += " WHERE " + " AND ".join(conditions)
+        sql += " ORDER BY matches.rank, id LIMIT ?"
+        params.append(limit)
+
+        result = self.execute_db_operation(sql, tuple(params), "Searched cereals successfully")
+
+        if result.status_code == 200 and not result.data:
+            return ApiResponse("error", "No cereals found for search", 404)
+
+        if result.data:
+            result.message = f"Found {len(result.data)} cereals for search"
+
+        return result
+
+    def stats(self, fields: List[str], group_by: str = None, aggregates=DEFAULT_AGGREGATES,
+              filters: List[Filter] = None, top: int = None) -> ApiResponse:
+        """
+        Computes aggregates of the numeric fields over every (matching) cereal, optionally per group_by value,
+        from an in-memory ColumnSnapshot of the table instead of a query per request. See ColumnSnapshot.aggregate.
+        """
+        try:
+            snapshot = self._snapshot()
+        except sqlite3.Error as e:
+            return ApiResponse("error", "Database query failed", 500, details=str(e))
+
+        data = snapshot.aggregate(fields, group_by, aggregates, filters, top)
+        return ApiResponse("success", "Computed statistics", 200, data,
+                           message=f"Aggregated {sum(group['count'] for group in data['groups'])} cereals")
+
+    def similar(self, id: int, k: int = 10) -> ApiResponse:
+        """
+        Returns the k cereals with the most similar nutrition to the cereal id, closest first,
+        each with its distance in the standardized feature space (see SimilarityIndex).
+        """
+        return self._cached(("similar", id, k), lambda: self._similar(id, k))
+
+    def _similar(self, id: int, k: int) -> ApiResponse:
+        try:
+            neighbours = self._similarity_index().nearest(id, k)
+        except KeyError:
+            return ApiResponse("error", "Cereal not found", 404)
+        except sqlite3.Error as e:
+            return ApiResponse("error", "Database query failed", 500, details=str(e))
+
+        if not neighbours:
+            return ApiResponse("success", "Found 0 similar cereals", 200, [])
+
+        placeholders = ", ".join(["?"] * len(neighbours))
+        result = self.execute_db_operation(
+            f"SELECT * FROM {self.table_name} WHERE id IN ({placeholders})",
+            tuple(neighbour for neighbour, _ in neighbours), "Found similar cereals")
+
+        if result.status_code == 200:
+            rows = {row["id"]: row for row in result.data}
+            result.data = [{**rows[neighbour], "distance": distance}
+                           for neighbour, distance in neighbours if neighbour in rows]
+            result.message = f"Found {len(result.data)} similar cereals"
+
+        return result
+
+    def _data_version(self) -> int:
+        # PRAGMA data_version changes whenever another connection commits, in this process or any other.
+        # It is read on a connection that never writes, so every commit is counted.
+        if self.watch_pool is None:
+            return self.version
+
+        with self.watch_pool.connection() as connection:
+            return connection.execute("PRAGMA data_version").fetchone()[0]
+
+    def _select(self, columns) -> List[tuple]:
+        with self.connect_reader() as connection:
+            cursor = connection.cursor()
+            cursor.row_factory = None
+            return cursor.execute(f"SELECT id, {', '.join(columns)} FROM {self.table_name}").fetchall()
+
+    def explain(self, filters: List[Filter], sort: str = None) -> List[str]:
+        """
+        Returns the EXPLAIN QUERY PLAN lines for a filter query as the API runs it (first page),
+        useful to check that it searches an index ('SEARCH ... USING INDEX') instead of scanning the table.
+        """
+        query = Query(self.table_name, filters, sort, limit=DEFAULT_PAGE_SIZE)
+        sql, params = query.to_sql(self._by_index(query))
+
+        with self.connect_reader() as connection:
+            rows = connection.execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+
+        return [row["detail"] for row in rows]
+
+    def stream(self, filters: List[Filter] = None, batch_size: int = 500):
+        """
+        A generator over every (matching) cereal by id, in lists of at most batch_size dicts.
+        Every batch is its own keyset query (stream_page), so between batches a slow consumer holds neither
+        a pooled connection nor a read transaction. Raises RuntimeError if a query fails.
+        """
+        cursor = None
+        while True:
+            result = self.stream_page(filters, batch_size, cursor)
+            if result.status_code == 404:
+                return
+            if result.status_code != 200:
+                raise RuntimeError(result.action)
+
+            yield result.data
+
+            cursor = result.next_cursor
+            if cursor is None:
+                return
+
+    def stream_page(self, filters: List[Filter] = None, limit: int = 500, cursor: str = None) -> ApiResponse:
+        return self._filter(Query(self.table_name, filters, limit=limit, cursor=cursor))
+
     def does_product_exist(self, id: int) -> bool:
-        result = self.read(id)
+        result = self.execute_query(self.statements["exists"], (id,))
         return bool(result.data)
 
-    def insert_data(self, cereals: List[Cereal]) -> ApiResponse:
-        columns, placeholders = get_columns_and_placeholders(cereals[0])
-        # Make sure to use INSERT OR IGNORE to avoid inserting duplicate data
-        query = f"INSERT OR IGNORE INTO cereals ({columns}) VALUES ({placeholders})"
-        data = [(
-            cereal.name, cereal.mfr, cereal.type_, cereal.calories, cereal.protein, cereal.fat,
-            cereal.sodium, cereal.fiber, cereal.carbo, cereal.sugars, cereal.potass,
-            cereal.vitamins, cereal.shelf, cereal.weight, cereal.cups, cereal.rating
-        ) for cereal in cereals]
-        result = self.execute_db_operation(
-            query, data, "Inserted cereals successfully", multiple=True)
+    def insert_data(self, cereals) -> ApiResponse:
+        """
+        Inserts many cereals in one transaction with executemany.
+        Takes Cereal objects or row tuples in Cereal.COLUMNS order (e.g. a chunk from Parser.read_chunks),
+        the rows are consumed lazily so a generator is never materialized.
+        """
+        data = (cereal.to_row() if isinstance(cereal, Cereal) else cereal for cereal in cereals)
+        with self._write_lock:
+            result = self.execute_db_operation(
+                self.statements["insert_data"], data, "Inserted cereals successfully", multiple=True)
+
+            if result.status_code == 201:
+                self._invalidate()
+
         return result
 
-    def execute_query(self, query: str, data=None, multiple=False) -> ApiResponse:
+    def seed(self, parser: Parser) -> ApiResponse:
+        """
+        Loads the parser's CSV file into the table, but only if it changed since the last time it was seeded.
+        The file's size and modification time are checked first, then its SHA-256, against seed_metadata.
+        A changed file is applied as an upsert on (name, mfr): changed rows are updated and new rows inserted,
+        so restarting the application doesn't add duplicates. Rows removed from the file are kept.
+        Everything, including the new metadata, is written in one transaction.
+        """
+        source = os.path.abspath(parser.file_path)
+        stat = os.stat(source)
+
+        with self._write_lock:
+            try:
+                with self.connect() as connection:
+                    seeded = connection.execute(
+                        "SELECT sha256, size, mtime_ns FROM seed_metadata WHERE source = ?", (source,)).fetchone()
+
+                    if seeded and (seeded["size"], seeded["mtime_ns"]) == (stat.st_size, stat.st_mtime_ns):
+                        return ApiResponse("success", "Seed file is unchanged", 200, {"inserted": 0, "updated": 0})
+
+                    sha256 = file_sha256(source)
+                    inserted = updated = 0
+
+                    if not seeded or seeded["sha256"] != sha256:
+                        # rowcount, not total_changes, which also counts the writes of the search index triggers
+                        for chunk in parser.read_chunks():
+                            updated += connection.executemany(self.statements["seed_update"].sql,
+                                                              [row[2:] + row[:2] + row[2:] for row in chunk]).rowcount
+                            inserted += connection.executemany(self.statements["seed_insert"].sql,
+                                                               [row + row[:2] for row in chunk]).rowcount
+
+                    connection.execute(
+                        "INSERT OR REPLACE INTO seed_metadata (source, sha256, size, mtime_ns) VALUES (?, ?, ?, ?)",
+                        (source, sha256, stat.st_size, stat.st_mtime_ns))
+
+            except sqlite3.Error as e:
+                return ApiResponse("error", "Database query failed", 500, details=str(e))
+
+            if inserted or updated:
+                self._invalidate()
+
+        return ApiResponse("success", "Seeded cereals successfully", 200, {"inserted": inserted, "updated": updated})
+
+    def batch(self, operations: list) -> ApiResponse:
+        """
+        Runs a list of (op, id, cereal) operations in one transaction, op is "create", "update" or "delete".
+        Runs of the same operation are sent with executemany in one transaction. It doesn't go through insert_data,
+        whose INSERT OR IGNORE can't report the new ids and whose execute_query call commits on its own.
+        For updates and deletes the existing ids are looked up first, so each item still gets its own 404.
+        The response data has one {"op", "status_code", "id"} entry per operation, in order.
+        If the database fails, the transaction is rolled back and nothing is applied.
+        Only the cache entries of the written ids are dropped, like for single writes. The GroupCommitWriter uses it too.
+        """
+        results = [None] * len(operations)
+
+        with self._write_lock:
+            try:
+                with self.connect() as connection:
+                    cursor = connection.cursor()
+
+                    for op, group in groupby(enumerate(operations), key=lambda item: item[1][0]):
+                        group = [(index, id, cereal) for index, (_, id, cereal) in group]
+
+                        if op == "create":
+                            cursor.executemany(self.statements["create"].sql, [cereal.to_row() for _, _, cereal in group])
+                            # Nothing else can write while this transaction holds the write lock,
+                            # so the new AUTOINCREMENT ids are the last len(group) values of the sequence
+                            last_id = cursor.execute(
+                                "SELECT seq FROM sqlite_sequence WHERE name = ?", (self.table_name,)).fetchone()[0]
+                            for offset, (index, _, _) in enumerate(group):
+                                results[index] = {"op": op, "status_code": 201, "id": last_id - len(group) + 1 + offset}
+                            continue
+
+                        ids = [id for _, id, _ in group]
+                        placeholders = ", ".join(["?"] * len(ids))
+                        existing = {row["id"] for row in cursor.execute(
+                            f"SELECT id FROM {self.table_name} WHERE id IN ({placeholders})", ids)}
+                        rows = []
+
+                        for index, id, cereal in group:
+                            if id not in existing:
+                                results[index] = {"op": op, "status_code": 404, "id": id, "message": "Cereal not found"}
+                                continue
+
+                            if op == "delete":
+                                existing.discard(id)  # Deleting the same id twice: the second one is a 404
+                                rows.append((id,))
+                                results[index] = {"op": op, "status_code": 200, "id": id}
+                            else:
+                                rows.append(cereal.to_row() + (id,))
+                                results[index] = {"op": op, "status_code": 201, "id": id}
+
+                        cursor.executemany(self.statements[op].sql, rows)
+
+            except sqlite3.Error as e:
+                return ApiResponse("error", "Database query failed", 500, details=str(e))
+
+            changes = [(result["op"], result["id"], cereal.to_row() if result["op"] != "delete" else None)
+                       for result, (_, _, cereal) in zip(results, operations) if result["status_code"] != 404]
+            if changes:
+                self._invalidate_many(changes)
+
+        return ApiResponse("success", "Batch executed successfully", 200, results)
+
+    def execute_query(self, query, data=None, multiple=False) -> ApiResponse:
         """
         This method is used to execute SQL queries on the database.
+        The query is either a prepared Statement or SQL text, which is looked up in the statement cache.
         It returns an ApiResponse object with the appropriate response and status code.
         """
-        query_type = query.strip().split(" ")[0].upper()
+        statement = query if isinstance(query, Statement) else get_statement(query)
+        query = statement.sql
+        query_type = statement.query_type
+        start = time.perf_counter()
+        cursor = None
+        rows = None
+
+        # Only SELECTs can run on a read-only connection
+        connect = self.connect_reader if query_type == "SELECT" else self.connect
 
         try:
-            with self.connect() as connection:
+            with connect() as connection:
                 cursor = connection.cursor()
 
                 # This handles CREATE queries. It currently only supports CREATE TABLE queries.
@@ -159,9 +639,10 @@ class SQLiteClient:
                     return result
 
                 if query_type == "SELECT":
+                    cursor.row_factory = None
                     cursor.execute(query, data or [])
-                    result = cursor.fetchall()
-                    data = [dict(row) for row in result]
+                    data = as_dicts(cursor, cursor.fetchall())
+                    rows = len(data)
                     return ApiResponse("success", "Query executed successfully", 200, data)
 
                 """
@@ -170,29 +651,41 @@ class SQLiteClient:
                 INSERT: 201 (Created)
                 UPDATE: 200 (OK)
                 DELETE: 204 (No Content/Deleted)
+                UPDATE and DELETE return 404 (Not Found) when no row matched, so no separate existence check is needed.
                 """
                 if query_type == "INSERT":
                     if multiple:
                         cursor.executemany(query, data)
-                    else:
-                        cursor.execute(query, data)
-                        connection.commit()
-                    return ApiResponse("success", "Resource created successfully", 201)
+                        return ApiResponse("success", "Resource created successfully", 201)
+
+                    cursor.execute(query, data)
+                    connection.commit()
+                    return ApiResponse("success", "Resource created successfully", 201, {"id": cursor.lastrowid})
 
                 if query_type == "UPDATE":
                     cursor.execute(query, data)
+                    if cursor.rowcount == 0:
+                        return ApiResponse("error", "Resource not found", 404)
                     connection.commit()
                     return ApiResponse("success", "Resource updated successfully", 201)
 
                 if query_type == "DELETE":
                     cursor.execute(query, data)
+                    if cursor.rowcount == 0:
+                        return ApiResponse("error", "Resource not found", 404)
                     connection.commit()
                     return ApiResponse("success", "Resource deleted successfully", 200)
 
         except sqlite3.Error as e:
             return ApiResponse("error", "Database query failed", 500, details=str(e))
 
-    def execute_db_operation(self, query: str, params: tuple, success_message: str, multiple=None) -> ApiResponse:
+        finally:
+            if self.metrics:
+                if rows is None:
+                    rows = cursor.rowcount if cursor else 0
+                self.metrics.observe_query(query_type, query, time.perf_counter() - start, rows)
+
+    def execute_db_operation(self, query, params: tuple, success_message: str, multiple=None) -> ApiResponse:
         """
         This method functions as a wrapper around the execute_query method.
         It ensures that the appropriate success message is returned based on the query type.   
@@ -206,4 +699,8 @@ class SQLiteClient:
     # This method is used to drop the table if it exists. It is useful for testing purposes.
     def drop_table(self) -> ApiResponse:
         query = f"DROP TABLE IF EXISTS {self.table_name};"
-        return self.execute_query(query)
+        with self._write_lock:
+            result = self.execute_query(query)
+            self.execute_query(f"DROP TABLE IF EXISTS {self.fts_table};")
+            self._invalidate()
+        return result
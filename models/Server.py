@@ -0,0 +1,120 @@
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+import requests
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class Server:
+    """
+    This class runs the Flask app under a production WSGI server instead of the Flask development server.
+    - workers=1: waitress serves the given app in a background thread of this process with `threads` threads.
+    - workers>1: gunicorn runs `workers` processes with `threads` threads each, using the app from wsgi.py.
+      Every worker has its own SQLiteClient, so the in-process read cache is disabled there
+      (a write in one worker couldn't invalidate the cache of the others) and it runs with multi_process.
+    wait_until_ready polls /ping instead of sleeping a fixed time, stop shuts the server down gracefully:
+    requests that are being handled are finished first.
+    """
+    def __init__(self, app=None, host: str = "127.0.0.1", port: int = 5000, workers: int = 1, threads: int = 8,
+                 graceful_timeout: float = 30.0, env: dict = None):
+        if workers > 1 and os.name == "nt":
+            raise RuntimeError("Multiple worker processes need gunicorn, which doesn't run on Windows")
+
+        self.app = app
+        self.host = host
+        self.port = port
+        self.workers = workers
+        self.threads = threads
+        self.graceful_timeout = graceful_timeout
+        self.env = env or {}  # Extra environment variables for the gunicorn workers, see wsgi.py
+        self._server = None
+        self._thread = None
+        self._process = None
+
+    @property
+    def url(self):
+        return f"{self.host}:{self.port}"
+
+    def start(self):
+        if self.workers > 1:
+            self._start_gunicorn()
+        else:
+            self._start_waitress()
+
+    def _start_waitress(self):
+        from waitress.server import create_server
+
+        self._server = create_server(self.app, host=self.host, port=self.port, threads=self.threads)
+        self._thread = threading.Thread(target=self._server.run, name="waitress", daemon=True)
+        self._thread.start()
+
+    def _start_gunicorn(self):
+        env = {**os.environ, **self.env, "CEREAL_CACHE_SIZE": "0", "CEREAL_MULTI_PROCESS": "1"}
+        command = [
+            sys.executable, "-m", "gunicorn",
+            "--workers", str(self.workers),
+            "--threads", str(self.threads),
+            "--bind", self.url,
+            "--graceful-timeout", str(int(self.graceful_timeout)),
+            "--chdir", PROJECT_ROOT,
+            "wsgi:app",
+        ]
+        self._process = subprocess.Popen(command, env=env)
+
+    def wait_until_ready(self, timeout: float = 30.0):
+        wait_until_ready(self.url, timeout, self._process)
+
+    def stop(self):
+        if self._process:
+            # gunicorn stops accepting connections on SIGTERM and lets the workers finish their requests
+            self._process.send_signal(signal.SIGTERM)
+            try:
+                self._process.wait(self.graceful_timeout)
+            except subprocess.TimeoutExpired:
+                self._process.kill()
+            self._process = None
+
+        if self._server:
+            self._server.close()
+            self._thread.join(self.graceful_timeout)
+            self._server = None
+
+    def serve_forever(self):
+        """Blocks until SIGINT (Ctrl+C) or SIGTERM, then stops the server."""
+        stopped = threading.Event()
+
+        def handle_signal(signum, frame):
+            stopped.set()
+
+        signal.signal(signal.SIGTERM, handle_signal)
+        try:
+            while not stopped.wait(0.5):
+                if self._process and self._process.poll() is not None:
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            self.stop()
+
+
+def wait_until_ready(url: str, timeout: float = 30.0, process=None):
+    """Polls GET /ping until the API answers, raises TimeoutError after timeout seconds."""
+    deadline = time.monotonic() + timeout
+
+    while time.monotonic() < deadline:
+        if process and process.poll() is not None:
+            raise RuntimeError(f"Server exited with code {process.returncode}")
+
+        try:
+            if requests.get(f"http://{url}/ping", timeout=1).status_code == 200:
+                return
+        except requests.RequestException:
+            pass
+
+        time.sleep(0.05)
+
+    raise TimeoutError(f"API at {url} was not ready after {timeout} seconds")
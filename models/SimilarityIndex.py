@@ -0,0 +1,126 @@
+import threading
+from typing import List, Tuple
+import numpy as np
+
+# The nutrition vector cereals are compared on
+FEATURES = ("calories", "protein", "fat", "sodium", "fiber", "carbo", "sugars", "potass", "vitamins")
+
+
+class SimilarityIndex:
+    """
+    This class finds the cereals with the most similar nutrition vector (FEATURES), for GET /cereals/<id>/similar.
+    Every feature is standardized (z-score) so calories and sodium don't outweigh the small-valued fields,
+    missing values count as the average. The standardized matrix and the squared norm of every row are kept,
+    so a query is one matrix-vector product and an argpartition instead of a pass over the table.
+    upsert() and remove() change single rows in place: new rows are appended to a buffer that doubles
+    when it is full, a removed row is replaced by the last one. They reuse the current means and deviations,
+    which are recomputed from the raw values once more than restandardize_ratio of the rows changed.
+    """
+    def __init__(self, restandardize_ratio: float = 0.1):
+        self.restandardize_ratio = restandardize_ratio
+        self._lock = threading.RLock()
+        self.size = 0
+        self._ids = np.zeros(0, dtype=np.int64)
+        self._raw = np.zeros((0, len(FEATURES)))
+        self._matrix = np.zeros((0, len(FEATURES)))
+        self._norms = np.zeros(0)
+        self._positions = {}  # id -> row in the arrays
+        self._mean = np.zeros(len(FEATURES))
+        self._scale = np.ones(len(FEATURES))
+        self._changes = 0
+
+    def build(self, rows: List[tuple]):
+        """Replaces the index with rows of (id, *FEATURES)."""
+        with self._lock:
+            self.size = len(rows)
+            data = np.array(rows, dtype=np.float64).reshape(len(rows), len(FEATURES) + 1)
+            self._ids = data[:, 0].astype(np.int64)
+            self._raw = data[:, 1:]
+            self._positions = {id: position for position, id in enumerate(self._ids.tolist())}
+            self._standardize()
+
+    def _standardize(self):
+        raw = self._raw[:self.size]
+
+        if self.size:
+            with np.errstate(invalid="ignore"):
+                mean = np.nanmean(raw, axis=0)
+                scale = np.nanstd(raw, axis=0)
+            self._mean = np.nan_to_num(mean)
+            self._scale = np.where(np.isnan(scale) | (scale == 0), 1.0, scale)
+
+        self._matrix = np.zeros_like(self._raw)
+        self._norms = np.zeros(len(self._raw))
+        self._matrix[:self.size] = self._normalize(raw)
+        self._norms[:self.size] = np.einsum("ij,ij->i", self._matrix[:self.size], self._matrix[:self.size])
+        self._changes = 0
+
+    def _normalize(self, raw):
+        return np.nan_to_num((raw - self._mean) / self._scale)  # NaN (NULL) lands on the mean
+
+    def upsert(self, id: int, features: tuple):
+        with self._lock:
+            raw = np.array(features, dtype=np.float64)
+            position = self._positions.get(id)
+
+            if position is None:
+                if self.size == len(self._raw):
+                    self._grow()
+                position = self.size
+                self.size += 1
+                self._positions[id] = position
+                self._ids[position] = id
+
+            self._raw[position] = raw
+            self._matrix[position] = self._normalize(raw)
+            self._norms[position] = self._matrix[position] @ self._matrix[position]
+            self._changed()
+
+    def remove(self, id: int):
+        with self._lock:
+            position = self._positions.pop(id, None)
+            if position is None:
+                return
+
+            last = self.size - 1
+            if position != last:
+                moved = int(self._ids[last])
+                for array in (self._ids, self._raw, self._matrix, self._norms):
+                    array[position] = array[last]
+                self._positions[moved] = position
+
+            self.size -= 1
+            self._changed()
+
+    def _grow(self):
+        capacity = max(16, len(self._raw) * 2)
+        self._ids = np.resize(self._ids, capacity)
+        for name in ("_raw", "_matrix"):
+            array = np.zeros((capacity, len(FEATURES)))
+            array[:self.size] = getattr(self, name)[:self.size]
+            setattr(self, name, array)
+        self._norms = np.resize(self._norms, capacity)
+
+    def _changed(self):
+        self._changes += 1
+        if self._changes > self.restandardize_ratio * max(self.size, 1):
+            self._standardize()
+
+    def nearest(self, id: int, k: int) -> List[Tuple[int, float]]:
+        """Returns up to k (id, distance) pairs closest to the cereal id, closest first. Raises KeyError for an unknown id."""
+        with self._lock:
+            position = self._positions[id]
+            vector = self._matrix[position]
+
+            # Squared euclidean distance |x - v|^2 = |x|^2 - 2 x.v + |v|^2 for every row at once
+            distances = self._norms[:self.size] - 2 * (self._matrix[:self.size] @ vector) + self._norms[position]
+            distances[position] = np.inf  # Not similar to itself
+
+            k = min(k, self.size - 1)
+            if k <= 0:
+                return []
+
+            candidates = np.argpartition(distances, k - 1)[:k]
+            candidates = candidates[np.argsort(distances[candidates], kind="stable")]
+
+            return [(int(self._ids[index]), float(np.sqrt(max(distances[index], 0.0)))) for index in candidates]
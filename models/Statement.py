@@ -0,0 +1,21 @@
+from functools import lru_cache
+
+
+class Statement:
+    """
+    A SQL statement whose text and query type are worked out once and then reused for every call.
+    execute_query only has to bind the parameters, and because the connections are pooled
+    sqlite3 can reuse its compiled version of the statement as well.
+    """
+    def __init__(self, sql: str):
+        self.sql = sql
+        self.query_type = sql.strip().split(" ")[0].upper()
+
+    def __str__(self):
+        return self.sql
+
+
+@lru_cache(maxsize=256)
+def get_statement(sql: str) -> Statement:
+    # Statement cache for SQL that is built at runtime (e.g. filters), so the text is only parsed once
+    return Statement(sql)
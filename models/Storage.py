@@ -0,0 +1,295 @@
+import copy
+import threading
+from abc import ABC, abstractmethod
+from typing import List
+from models.ApiResponse import ApiResponse
+from models.Cereal import Cereal
+from models.ColumnSnapshot import ColumnSnapshot
+from models.Filter import Filter
+from models.Metrics import Metrics
+from models.QueryCache import QueryCache
+from models.SimilarityIndex import FEATURES, SimilarityIndex
+
+# Names for create_storage (main.py --storage, CEREAL_STORAGE)
+STORAGES = ("sqlite", "memory")
+
+
+class Storage(ABC):
+    """
+    This class is the interface the APIs use to store cereals, implemented by SQLiteClient and MemoryStorage.
+    Every method returns an ApiResponse, with the same status codes and messages in every implementation.
+    The CRUD, filter, stream, stream_page, insert_data and _select methods are abstract. search, similar, stats, batch and seed are optional
+    and answer 501 unless the implementation supports them.
+    The base class keeps what every implementation shares:
+    - the read-through QueryCache (_cached), which the writes invalidate (_invalidate), cache_size=0 disables it
+    - version, bumped by every write, the APIs derive their ETags from it
+    - the write listeners, called with (op, id, row) after every write. The implementations hold _write_lock
+      from a write's commit until its listeners ran, so the listeners see the writes in commit order
+    - the ColumnSnapshot for stats and the SimilarityIndex for similar, loaded with _select and then kept up to date
+      by write listeners. With multi_process (several server processes share the data) they are reloaded
+      when _data_version shows a write of any process
+    """
+    def __init__(self, cache_size: int = 1024, cache_ttl: float = 60.0, metrics: Metrics = None,
+                 multi_process: bool = False):
+        self.metrics = metrics
+        self.multi_process = multi_process
+        self.cache = QueryCache(cache_size, cache_ttl) if cache_size else None
+        self.version = 0  # Table version, bumped by every write
+        self._version_lock = threading.Lock()
+        self._write_lock = threading.RLock()  # Orders every commit with its _invalidate call
+        self.snapshot = None  # ColumnSnapshot for stats(), built on first use and then kept up to date
+        self._snapshot_changes = []  # Single-row writes not applied to the snapshot yet, see _update_snapshot
+        self._snapshot_version = None  # _data_version the snapshot was loaded at, with multi_process
+        self._snapshot_lock = threading.Lock()
+        self._listeners = []
+        self.similarity = None  # SimilarityIndex for similar(), built on first use and then kept up to date
+        self._similarity_version = None  # _data_version the similarity index was loaded at, with multi_process
+        self._similarity_lock = threading.Lock()
+        self.add_write_listener(self._update_snapshot)
+        self.add_write_listener(self._update_similarity)
+
+        if metrics and self.cache:
+            metrics.add_collector(self._cache_gauges)
+
+    @property
+    def concurrency(self) -> int:
+        # How many calls can usefully run at the same time, sizes the thread pool of AsyncSQLiteClient
+        return 1
+
+    @abstractmethod
+    def create(self, cereal: Cereal) -> ApiResponse:
+        """Adds a cereal, 201 with {"id": new id}."""
+
+    @abstractmethod
+    def read_all(self, limit: int = None, cursor: str = None, fields: List[str] = None) -> ApiResponse:
+        """
+        Every cereal by id, or a page of limit cereals after the cursor (next_cursor is set if there are more).
+        fields selects the fields of each cereal, see parse_fields in models.Query.
+        """
+
+    @abstractmethod
+    def read(self, id: int, fields: List[str] = None) -> ApiResponse:
+        """The cereal (only the fields, if given) as a one-element list, 404 if there is none with the id."""
+
+    @abstractmethod
+    def update(self, id: int, cereal: Cereal) -> ApiResponse:
+        """Replaces every field of the cereal, 201, or 404 if there is none with the id."""
+
+    @abstractmethod
+    def delete(self, id: int) -> ApiResponse:
+        """Removes the cereal, 200, or 404 if there is none with the id."""
+
+    @abstractmethod
+    def list(self) -> ApiResponse:
+        """Every cereal, not cached."""
+
+    @abstractmethod
+    def filter(self, filters: List[Filter], limit: int = None, cursor: str = None,
+               sort: str = None, fields: List[str] = None) -> ApiResponse:
+        """
+        The cereals matching every filter, see Query for the sorting, projection and pagination.
+        404 if nothing matches, raises ValueError for an invalid sort, field or cursor.
+        """
+
+    @abstractmethod
+    def stream(self, filters: List[Filter] = None, batch_size: int = 500):
+        """A generator over every (matching) cereal by id, in lists of at most batch_size dicts."""
+
+    @abstractmethod
+    def stream_page(self, filters: List[Filter] = None, limit: int = 500, cursor: str = None) -> ApiResponse:
+        """
+        One batch of a stream as a keyset page by id, like filter but not cached.
+        Nothing is held between pages, so a slow consumer doesn't keep a connection. 404 if nothing matches.
+        """
+
+    @abstractmethod
+    def insert_data(self, cereals) -> ApiResponse:
+        """Adds many cereals at once, Cereal objects or row tuples in Cereal.COLUMNS order. 201."""
+
+    @abstractmethod
+    def does_product_exist(self, id: int) -> bool:
+        pass
+
+    @abstractmethod
+    def close(self):
+        pass
+
+    @abstractmethod
+    def _select(self, columns) -> List[tuple]:
+        """Every row as an (id, *columns) tuple, for the snapshot and the similarity index."""
+
+    def _data_version(self) -> int:
+        # Changes with every committed write, of any process when multi_process is supported
+        return self.version
+
+    def _unsupported(self, feature: str) -> ApiResponse:
+        return ApiResponse("error", f"{feature} is not supported by {type(self).__name__}", 501)
+
+    def search(self, match: str, filters: List[Filter] = None, limit: int = None) -> ApiResponse:
+        return self._unsupported("Search")
+
+    def similar(self, id: int, k: int = 10) -> ApiResponse:
+        return self._unsupported("Similarity search")
+
+    def stats(self, fields: List[str], group_by: str = None, aggregates=None,
+              filters: List[Filter] = None, top: int = None) -> ApiResponse:
+        return self._unsupported("Statistics")
+
+    def batch(self, operations: list) -> ApiResponse:
+        return self._unsupported("Batch writes")
+
+    def seed(self, parser) -> ApiResponse:
+        return self._unsupported("Seeding")
+
+    def _cached(self, key, load) -> ApiResponse:
+        """
+        Returns the cached response for key, or calls load() and caches its response.
+        A copy is returned so callers can change the message without touching the cached response.
+        """
+        if self.cache is None:
+            return load()
+
+        hit, result = self.cache.get(key)
+        if hit:
+            return copy.copy(result)
+
+        generation = self.cache.generation
+        result = load()
+
+        # Database errors are not cached, "not found" responses are
+        if result.status_code < 500:
+            self.cache.put(key, copy.copy(result), generation)
+
+        return result
+
+    def _invalidate(self, id: int = None, op: str = "reset", row: tuple = None):
+        # A single write, see _invalidate_many. Without an id (bulk writes) the whole cache is cleared.
+        self._invalidate_many([(op, id, row)])
+
+    def _invalidate_many(self, changes: list):
+        """
+        Drops the cache entries the writes can affect: every list (read_all/filter/search/...) result
+        and the read entries of their ids. A change without an id (a bulk write) clears the whole cache.
+        The table version is bumped once and every change is passed on to the write listeners as (op, id, row):
+        "create" or "update" with the new row in Cereal.COLUMNS order, "delete", or "reset" after a bulk write.
+        """
+        with self._version_lock:
+            self.version += 1
+
+        for op, id, row in changes:
+            for listener in self._listeners:
+                listener(op, id, row)
+
+        if self.cache is None:
+            return
+
+        ids = {id for _, id, _ in changes}
+        if None in ids:
+            self.cache.clear()
+            return
+
+        self.cache.invalidate(lambda key: key[0] != "read" or key[1] in ids)
+
+    def _cache_gauges(self):
+        stats = self.cache.stats()
+        return [
+            ("cereal_cache_hits", "Read cache hits", stats["hits"]),
+            ("cereal_cache_misses", "Read cache misses", stats["misses"]),
+            ("cereal_cache_entries", "Entries in the read cache", stats["size"]),
+        ]
+
+    def add_write_listener(self, listener):
+        # listener(op, id, row) is called after every committed write, see _invalidate
+        self._listeners.append(listener)
+
+    def cache_stats(self) -> ApiResponse:
+        if self.cache is None:
+            return ApiResponse("success", "Cache is disabled", 200, {"enabled": False})
+
+        return ApiResponse("success", "Fetched cache statistics", 200, {"enabled": True, **self.cache.stats()})
+
+    def _snapshot(self) -> ColumnSnapshot:
+        """
+        Returns the snapshot, loading it the first time and after a bulk write.
+        The single-row writes collected by _update_snapshot are applied to it first (ColumnSnapshot.apply).
+        With multi_process it is also loaded again when _data_version changed,
+        because writes made by another process never reach this process' listeners.
+        """
+        with self._snapshot_lock:
+            # Read before the rows, so a write during the load leads to another load
+            version = self._data_version() if self.multi_process else None
+            if self.snapshot is None or version != self._snapshot_version:
+                # The collected writes were committed before the load, so the loaded rows have them
+                self._snapshot_changes = []
+                self.snapshot = ColumnSnapshot(self._select(Cereal.COLUMNS))
+                self._snapshot_version = version
+            elif self._snapshot_changes:
+                self.snapshot = self.snapshot.apply(self._snapshot_changes)
+                self._snapshot_changes = []
+
+            return self.snapshot
+
+    def _update_snapshot(self, op: str, id: int, row: tuple):
+        # Write listener. The writes are only collected, the next stats() applies them all in one copy.
+        # More changes than rows are dropped with the snapshot, loading it again costs less than applying them
+        with self._snapshot_lock:
+            if self.snapshot is None:
+                return
+
+            if op == "reset" or len(self._snapshot_changes) >= self.snapshot.size:
+                self.snapshot = None
+                self._snapshot_changes = []
+            else:
+                self._snapshot_changes.append((op, id, row))
+
+    def _similarity_index(self) -> SimilarityIndex:
+        """
+        Returns the SimilarityIndex, loading it the first time and after a bulk write.
+        Single-row writes are applied to it by _update_similarity.
+        With multi_process it is also loaded again when _data_version changed,
+        because writes made by another process never reach this process' listeners.
+        """
+        with self._similarity_lock:
+            # Read before the rows, so a write during the load leads to another load
+            version = self._data_version() if self.multi_process else None
+            if self.similarity is None or version != self._similarity_version:
+                similarity = SimilarityIndex()
+                similarity.build(self._select(FEATURES))
+                self.similarity = similarity
+                self._similarity_version = version
+
+            return self.similarity
+
+    def _update_similarity(self, op: str, id: int, row: tuple):
+        # Write listener. The lock orders it with a load: a write is either in the loaded rows or applied after,
+        # applying it twice is harmless because upsert and remove are idempotent
+        with self._similarity_lock:
+            if self.similarity is None:
+                return
+
+            if op == "reset":
+                self.similarity = None
+            elif op == "delete":
+                self.similarity.remove(id)
+            else:
+                values = dict(zip(Cereal.COLUMNS, row))
+                self.similarity.upsert(id, tuple(values[feature] for feature in FEATURES))
+
+
+def create_storage(kind: str = "sqlite", database: str = "cereals.db", pool_size: int = 5, cache_size: int = 1024,
+                   metrics: Metrics = None, group_commit_ms: float = None, multi_process: bool = False) -> Storage:
+    """
+    Builds the storage named kind: "sqlite" (the database file, see SQLiteClient) or "memory" (see MemoryStorage),
+    database, pool_size, group_commit_ms and multi_process only apply to SQLite.
+    """
+    # Imported here because both implementations import this module
+    if kind == "sqlite":
+        from models.SQLiteClient import SQLiteClient
+        return SQLiteClient(database, pool_size=pool_size, cache_size=cache_size, metrics=metrics,
+                            group_commit_ms=group_commit_ms, multi_process=multi_process)
+
+    if kind == "memory":
+        from models.MemoryStorage import MemoryStorage
+        return MemoryStorage(cache_size=cache_size, metrics=metrics)
+
+    raise ValueError(f"Unknown storage '{kind}', use one of: {', '.join(STORAGES)}")
@@ -0,0 +1,74 @@
+import hashlib
+import json
+import threading
+import time
+from flask import Flask, g, request
+from utils import is_authorised
+
+# Request body fields that are never written to the capture file
+REDACTED_FIELDS = ("password",)
+REDACTED = "<redacted>"  # Captures made before the password's validity was kept
+# A redacted password keeps whether it was valid, so a replay sends a valid or an invalid one again
+REDACTED_VALID = "<redacted:valid>"
+REDACTED_INVALID = "<redacted:invalid>"
+
+# Response bodies up to this size are stored in the capture, larger ones only by hash
+MAX_CAPTURED_BODY = 64 * 1024
+
+
+class TrafficRecorder:
+    """
+    This class records the requests handled by a Flask app to a JSONL file, one request per line:
+    {"ts", "method", "path", "query", "body", "status", "duration_ms", "response_sha256", "response"}
+    The file can be replayed against another instance of the API with Replayer.
+    ts is the time the request arrived, so a replay keeps the original pacing.
+    Passwords in request bodies are redacted (only whether they were valid is kept),
+    streamed responses are recorded without their body.
+    """
+    def __init__(self, path: str = "traffic.jsonl"):
+        self.path = path
+        self._file = open(path, "a", encoding="utf-8")
+        self._lock = threading.Lock()
+
+    def install(self, app: Flask):
+        app.before_request(self._before_request)
+        app.after_request(self._after_request)
+
+    def _before_request(self):
+        g.capture_ts = time.time()
+        g.capture_start = time.perf_counter()
+
+    def _after_request(self, response):
+        duration_ms = (time.perf_counter() - g.get("capture_start", time.perf_counter())) * 1000
+        body = request.get_json(silent=True)
+
+        if isinstance(body, dict):
+            redacted = REDACTED_VALID if is_authorised(body) else REDACTED_INVALID
+            body = {key: redacted if key in REDACTED_FIELDS else value for key, value in body.items()}
+
+        record = {
+            "ts": g.get("capture_ts", time.time()),
+            "method": request.method,
+            "path": request.path,
+            "query": request.query_string.decode("utf-8", "replace"),
+            "body": body,
+            "status": response.status_code,
+            "duration_ms": round(duration_ms, 3),
+        }
+
+        if not response.is_streamed:
+            data = response.get_data()
+            record["response_sha256"] = hashlib.sha256(data).hexdigest()
+            if len(data) <= MAX_CAPTURED_BODY:
+                record["response"] = response.get_json(silent=True)
+
+        line = json.dumps(record) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+
+        return response
+
+    def close(self):
+        with self._lock:
+            self._file.close()
@@ -1,25 +1,85 @@
 import csv
-import itertools
-from typing import List
+from itertools import islice
+from typing import Iterator, List
 from models.Cereal import Cereal
 
 
+# Converters for the types named in the second header row of the CSV file
+def to_float(value: str) -> float:
+    try:
+        return float(value)
+    except ValueError:
+        # Some values were exported with every group of three digits separated by a dot (68.402.973),
+        # the first dot is the decimal point
+        whole, _, fraction = value.partition(".")
+        return float(f"{whole}.{fraction.replace('.', '')}")
+
+
+def to_int(value: str) -> int:
+    try:
+        return int(value)
+    except ValueError:
+        return int(to_float(value))
+
+
+CONVERTERS = {
+    "String": str,
+    "Categorical": str,
+    "Int": to_int,
+    "Float": to_float,
+}
+
+# CSV header -> database column, for the headers that differ
+COLUMN_NAMES = {"type": "type_"}
+
+
 class Parser():
-    """" This class is responsible for reading the CSV file and returning a list of Cereal objects """
-    def __init__(self, file="Cereal"):
+    """"
+    This class is responsible for reading the CSV file.
+    The file has two header rows: the field names, and the type of each field (String, Categorical, Int or Float).
+    read_rows is a generator: it converts one line at a time to a typed tuple in Cereal.COLUMNS order,
+    read_chunks groups those tuples in lists of chunk_size, so loading the file only keeps one chunk in memory.
+    """
+    def __init__(self, file="Cereal", chunk_size=1000):
         self.file = file
         self.file_path = f"data/{self.file}.csv"
+        self.chunk_size = chunk_size
 
-    def read_csv(self):
+    def read_rows(self) -> Iterator[tuple]:
         with open(self.file_path, newline="", encoding="utf-8") as f:
-            reader = csv.DictReader(f, delimiter=";")
-            rows = list(itertools.islice(reader, 2, None))
-            cereals: List[Cereal] = []
-            
-            for row in rows:
-                for key, value in row.items():
-                    if isinstance(value, str):
-                        row[key] = value.strip()  # Strip leading/trailing whitespace from strings
-                
-                cereals.append(Cereal.from_dict(row))
-            return cereals
+            reader = csv.reader(f, delimiter=";")
+            headers = [COLUMN_NAMES.get(header.strip(), header.strip()) for header in next(reader)]
+            types = [type_.strip() for type_ in next(reader)]
+
+            converters = {header: CONVERTERS.get(type_, str) for header, type_ in zip(headers, types)}
+            positions = [headers.index(column) if column in headers else None for column in Cereal.COLUMNS]
+            columns = list(zip(Cereal.COLUMNS, positions))
+
+            for line, values in enumerate(reader, start=3):
+                if not values:
+                    continue
+
+                try:
+                    yield tuple(
+                        self._convert(values[position], converters[column]) if position is not None else None
+                        for column, position in columns
+                    )
+                except (IndexError, ValueError) as e:
+                    raise ValueError(f"{self.file_path}, line {line}: {e}")
+
+    def _convert(self, value: str, converter):
+        value = value.strip()  # Strip leading/trailing whitespace from strings
+        return converter(value) if value else None
+
+    def read_chunks(self) -> Iterator[List[tuple]]:
+        rows = self.read_rows()
+
+        while True:
+            chunk = list(islice(rows, self.chunk_size))
+            if not chunk:
+                break
+            yield chunk
+
+    def read_csv(self) -> List[Cereal]:
+        # Turn the whole file into a list of Cereal objects, use read_chunks for large files
+        return [Cereal(*row) for row in self.read_rows()]
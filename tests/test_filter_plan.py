@@ -0,0 +1,52 @@
+"""
+Checks with EXPLAIN QUERY PLAN (SQLiteClient.explain) that selective filter queries of the API search an index
+instead of scanning the table.
+Run from the project root: python -m pytest tests
+"""
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.Filter import Filter
+from models.SQLiteClient import SQLiteClient
+
+ROWS = 5000
+
+
+def make_row(index):
+    # Every 100th cereal is a Kellogg's or General Mills corn cereal with few calories, the rest are bran
+    rare = index % 100 == 0
+    return (f"Corn Flakes {index}" if rare else f"Bran {index}", "KG"[index % 2] if rare else "N", "C",
+            60 if rare else 100 + index % 50, 4.0, 1.0, 130.0, 10.0, 5.0, 6.0, 280.0, 25.0, 3, 1.0, 0.33, index % 90)
+
+
+@pytest.fixture(scope="module")
+def client(tmp_path_factory):
+    client = SQLiteClient(str(tmp_path_factory.mktemp("plan") / "plan.db"), cache_size=0)
+    client.insert_data(make_row(index) for index in range(ROWS))
+    yield client
+    client.close()
+
+
+@pytest.mark.parametrize("filters, sort", [
+    ([Filter("calories", "100", "lt")], None),
+    ([Filter("mfr", "K,G", "in")], None),
+    ([Filter("name", "Corn", "prefix")], None),
+    ([Filter("rating", "50", "gte")], "-rating"),
+])
+def test_filter_uses_index(client, filters, sort):
+    plan = client.explain(filters, sort)
+    assert uses_index(plan), plan
+
+
+def test_unselective_filter_walks_in_id_order(client):
+    # Almost every row matches, so the first page is found sooner in id order than by sorting the index range
+    plan = client.explain([Filter("calories", "1000", "lt")])
+    assert not uses_index(plan), plan
+
+
+def uses_index(plan):
+    return any("USING INDEX" in line or "USING COVERING INDEX" in line for line in plan)
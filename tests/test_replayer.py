@@ -0,0 +1,54 @@
+"""
+Checks that Replayer sends the requests of a capture in the order they arrived, not the order they were written in.
+Run from the project root: python -m pytest tests
+"""
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.Replayer import Replayer
+
+# A slow GET that arrived first is written after the two requests that finished before it
+RECORDS = [
+    {"ts": 100.2, "method": "GET", "path": "/cereals/2", "status": 200},
+    {"ts": 100.3, "method": "GET", "path": "/cereals/3", "status": 200},
+    {"ts": 100.0, "method": "GET", "path": "/cereals", "status": 200},
+]
+
+
+class Response:
+    status_code = 200
+    headers = {}
+
+
+class Session:
+    def __init__(self):
+        self.paths = []
+
+    def request(self, method, endpoint, **kwargs):
+        self.paths.append(endpoint.split("127.0.0.1:5000", 1)[1])
+        return Response()
+
+
+def write_capture(tmp_path):
+    path = tmp_path / "capture.jsonl"
+    path.write_text("".join(json.dumps(record) + "\n" for record in RECORDS), encoding="utf-8")
+    return str(path)
+
+
+def test_load_sorts_by_arrival(tmp_path):
+    records = Replayer().load(write_capture(tmp_path))
+    assert [record["ts"] for record in records] == [100.0, 100.2, 100.3]
+
+
+def test_replay_sends_in_arrival_order(tmp_path):
+    replayer = Replayer(speed=0, workers=1)
+    session = Session()
+    replayer._session = lambda: session
+
+    result = replayer.replay(write_capture(tmp_path))
+
+    assert session.paths == ["/cereals", "/cereals/2", "/cereals/3"]
+    assert result["status_mismatches"] == 0
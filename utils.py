@@ -1,62 +1,264 @@
+import base64
 import csv
+import hashlib
+import json
 import os
+import re
 import dotenv
 from flask import jsonify
-from models.Filter import Filter
+from models.Filter import FILTERABLE_FIELDS, Filter
 from models.ApiResponse import ApiResponse
+from models.Cereal import Cereal
+from models.ColumnSnapshot import AGGREGATES, DEFAULT_AGGREGATES, PERCENTILE
 
 dotenv.load_dotenv
 
 password_from_env = os.getenv('PASSWORD', 'test_password')
 
+# Page size for list endpoints when the client doesn't pass ?limit=, and the largest page a client may ask for
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+# Largest number of operations accepted by POST /cereals/batch
+MAX_BATCH_SIZE = 1000
+
+# Largest number of words in a GET /cereals/search query
+MAX_SEARCH_WORDS = 10
+
+# Number of results of GET /cereals/<id>/similar without ?k=, and the most a client may ask for
+DEFAULT_SIMILAR = 10
+MAX_SIMILAR = 100
+
 
 def read_file(file):
     with open(file, 'r') as f:
         return f.read()
 
 
+def file_sha256(file):
+    # Hashes the file in blocks, so large files aren't read into memory
+    sha256 = hashlib.sha256()
+
+    with open(file, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            sha256.update(block)
+
+    return sha256.hexdigest()
+
+
 def filter_query(args):
+    """
+    Turns the query parameters into Filter objects.
+    A parameter is a field with an optional operator suffix, e.g. mfr=K, calories__lt=100,
+    name__prefix=Corn or mfr__in=K,G. See models.Filter for the fields and operators.
+    Parameters that aren't filters (limit, cursor, sort, fields, ...) are ignored.
+    """
     filters = []
 
-    # Is there a better way to do this?
-
-    filterable_fields = [
-        'name', 'mfr', 'type', 'calories', 'protein', 'fat', 'sodium',
-        'fiber', 'carbo', 'sugars', 'potass', 'vitamins', 'shelf',
-        'weight', 'cups', 'rating'
-    ]
+    for key in args:
+        field, _, operator = key.partition('__')
 
-    for field in filterable_fields:
-        if field not in args:
+        if field not in FILTERABLE_FIELDS:
             continue
 
-        value = args.get(field)
-
-        filter = Filter(field, value)
-        filters.append(filter)
+        for value in args.getlist(key) if hasattr(args, 'getlist') else [args.get(key)]:
+            filters.append(Filter(field, value, operator or 'eq'))
 
     return filters
 
 
+def sort_query(args):
+    # ?sort=rating or ?sort=-rating (descending), validated by Query
+    return args.get('sort') or None
+
+
+def fields_query(args):
+    # ?fields=name,rating returns only those fields (and id), validated by Query
+    fields = args.get('fields')
+
+    if not fields:
+        return None
+
+    return [field.strip() for field in fields.split(',') if field.strip()]
+
+
+def search_query(args):
+    """
+    Turns ?q= into an FTS5 match expression for SQLiteClient.search.
+    Every word of q must match the start of a word in the name, so 'corn fla' finds 'Corn Flakes'.
+    The words are quoted, so FTS5 operators and punctuation in q are treated as text.
+    """
+    words = re.findall(r"\w+", args.get('q') or '')
+
+    if not words:
+        raise ValueError("Search query 'q' must contain at least one word")
+
+    if len(words) > MAX_SEARCH_WORDS:
+        raise ValueError(f"Search query 'q' may contain at most {MAX_SEARCH_WORDS} words")
+
+    return " ".join(f'"{word}"*' for word in words)
+
+
+def similar_query(args):
+    # ?k= is the number of similar cereals to return
+    k = args.get('k', DEFAULT_SIMILAR)
+
+    try:
+        k = int(k)
+    except (TypeError, ValueError):
+        raise ValueError("k must be an integer")
+
+    if not 1 <= k <= MAX_SIMILAR:
+        raise ValueError(f"k must be between 1 and {MAX_SIMILAR}")
+
+    return k
+
+
+def stats_query(args):
+    """
+    Parses the parameters of GET /cereals/stats into (fields, group_by, aggregates, top):
+    ?fields=rating,sugars (numeric fields, default all), ?group_by=mfr, ?aggregates=avg,p90 and ?top=5.
+    """
+    numeric = [field for field, (_, type_) in FILTERABLE_FIELDS.items() if type_ is not str]
+
+    group_by = args.get('group_by') or None
+    if group_by and group_by not in FILTERABLE_FIELDS:
+        raise ValueError(f"Cannot group by unknown field '{group_by}'")
+
+    # Every group has its key under the group_by name, so that field can't have aggregates in the same entry
+    fields = fields_query(args) or [field for field in numeric if field != group_by]
+
+    for field in fields:
+        if field not in numeric:
+            raise ValueError(f"Cannot aggregate '{field}', use one of: {', '.join(numeric)}")
+        if field == group_by:
+            raise ValueError(f"Cannot aggregate the group_by field '{field}'")
+
+    aggregates = args.get('aggregates')
+    aggregates = [name.strip() for name in aggregates.split(',') if name.strip()] if aggregates else DEFAULT_AGGREGATES
+
+    for name in aggregates:
+        if name not in AGGREGATES and not PERCENTILE.match(name):
+            raise ValueError(f"Unknown aggregate '{name}', use one of: {', '.join(AGGREGATES)} or a percentile like p90")
+
+    top = args.get('top')
+    if top is not None:
+        try:
+            top = int(top)
+        except ValueError:
+            raise ValueError("top must be an integer")
+        if not 1 <= top <= MAX_PAGE_SIZE:
+            raise ValueError(f"top must be between 1 and {MAX_PAGE_SIZE}")
+
+    return fields, group_by, aggregates, top
+
+
+def batch_query(request_json):
+    """
+    Validates the operations of a POST /cereals/batch body.
+    Returns (operations, errors): operations is a list of (index, op, id, Cereal) for the valid items,
+    errors a list of per-item error results for the invalid ones.
+    Raises ValueError if the body itself is invalid.
+    """
+    items = request_json.get('operations')
+
+    if not isinstance(items, list) or not items:
+        raise ValueError("'operations' must be a non-empty list")
+
+    if len(items) > MAX_BATCH_SIZE:
+        raise ValueError(f"At most {MAX_BATCH_SIZE} operations are allowed per batch")
+
+    operations = []
+    errors = []
+
+    for index, item in enumerate(items):
+        op = item.get('op') if isinstance(item, dict) else None
+
+        try:
+            if op not in ('create', 'update', 'delete'):
+                raise ValueError("'op' must be 'create', 'update' or 'delete'")
+
+            id = item.get('id')
+            if op != 'create' and (not isinstance(id, int) or isinstance(id, bool)):
+                raise ValueError(f"'id' must be an integer for {op}")
+
+            cereal = None
+            if op != 'delete':
+                if not isinstance(item.get('cereal'), dict):
+                    raise ValueError(f"'cereal' must be an object for {op}")
+                cereal = Cereal.from_dict(item['cereal'])
+
+            operations.append((index, op, id, cereal))
+
+        except ValueError as e:
+            errors.append({"index": index, "op": op, "status_code": 400, "message": str(e)})
+
+    return operations, errors
+
+
+def page_query(args):
+    """
+    Reads the ?limit= and ?cursor= query parameters.
+    Returns (limit, cursor), raises ValueError if they are invalid.
+    """
+    limit = args.get('limit', DEFAULT_PAGE_SIZE)
+
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValueError("limit must be an integer")
+
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {MAX_PAGE_SIZE}")
+
+    cursor = args.get('cursor') or None
+
+    return limit, cursor
+
+
+def encode_cursor(values):
+    # Cursors are opaque to the client: the keyset values of the last row on the page, as url-safe base64 JSON
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
+
+    if not isinstance(values, list):
+        raise ValueError("Invalid cursor")
+
+    return values
+
+
 def get_columns_and_placeholders(cereal):
-    dict_keys = cereal.__dict__.keys()
-    # Exclude 'id' from the dictionary keys
-    columns = ', '.join(key for key in dict_keys if key != 'id')
-    placeholders = ', '.join(
-        ['?'] * len([key for key in dict_keys if key != 'id']))
+    # Accepts the Cereal class or an instance, the columns come from Cereal.COLUMNS ('id' is not included)
+    columns = ', '.join(cereal.COLUMNS)
+    placeholders = ', '.join(['?'] * len(cereal.COLUMNS))
 
     return columns, placeholders
 
 
+def get_assignments(cereal):
+    return ', '.join(f"{key} = ?" for key in cereal.COLUMNS)
+
+
 def get_assignments_and_values(cereal):
-    dict_keys = cereal.__dict__.keys()
-    assignments = ', '.join(f"{key} = ?" for key in dict_keys if key != 'id')
-    values = tuple(
-        value for key, value in cereal.__dict__.items() if key != 'id')
+    assignments = get_assignments(cereal)
+    values = cereal.to_row()
 
     return assignments, values
 
 
+def as_dicts(cursor, rows):
+    # Builds the row dicts from plain tuples (cursor.row_factory = None), which skips creating a sqlite3.Row per row
+    columns = [column[0] for column in cursor.description]
+    return [dict(zip(columns, row)) for row in rows]
+
+
 def jsonify_result(result):
     try:
         results = []
@@ -79,6 +281,16 @@ def validate_request_body(request):
     return None  # If validation passes, return None
 
 
+def body_id(request_json):
+    # The optional 'id' of a POST /cereals body. Like in batch_query it has to be an integer, SQLite would turn "12"
+    # into 12 but the read cache and the write listeners key on the int
+    id = request_json.get('id')
+    if id is not None and (not isinstance(id, int) or isinstance(id, bool)):
+        raise ValueError("'id' must be an integer")
+
+    return id
+
+
 def is_successful(status_code):
     if status_code == 200:
         return True
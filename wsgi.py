@@ -0,0 +1,36 @@
+import atexit
+import os
+from CerealAPI import CerealAPI
+from models.Metrics import Metrics
+from models.MemoryStorage import MemoryStorage
+from models.parser import Parser
+from models.Storage import create_storage
+
+
+def create_app():
+    """
+    Builds the Flask app for a WSGI server (e.g. gunicorn wsgi:app).
+    Configuration comes from the environment:
+    CEREAL_STORAGE (sqlite or memory), CEREAL_DB (database file), CEREAL_POOL_SIZE, CEREAL_CACHE_SIZE (0 disables the read cache),
+    CEREAL_GROUP_COMMIT_MS (group commit delay for writes, 0 commits every write on its own),
+    CEREAL_MULTI_PROCESS (1 when several worker processes share the database) and CEREAL_METRICS (1 enables /metrics).
+    The SQLite database is expected to be seeded already, e.g. by main.py, the memory storage is seeded here.
+    """
+    metrics = Metrics() if os.getenv("CEREAL_METRICS") == "1" else None
+    storage = create_storage(
+        os.getenv("CEREAL_STORAGE", "sqlite"),
+        os.getenv("CEREAL_DB", "cereals.db"),
+        pool_size=int(os.getenv("CEREAL_POOL_SIZE", 5)),
+        cache_size=int(os.getenv("CEREAL_CACHE_SIZE", 1024)),
+        group_commit_ms=float(os.getenv("CEREAL_GROUP_COMMIT_MS", 0)),
+        multi_process=os.getenv("CEREAL_MULTI_PROCESS") == "1",
+        metrics=metrics,
+    )
+    if isinstance(storage, MemoryStorage):
+        storage.seed(Parser())  # Starts empty in every process
+    atexit.register(storage.close)
+
+    return CerealAPI(storage, metrics=metrics).app
+
+
+app = create_app()